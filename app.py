@@ -1,14 +1,18 @@
-import casadi       as ca
-import scipy       # Optimization toolbox
+import time
+import uuid
 import streamlit    as st       # Web app toolbox
 import pandas       as pd       # DataFrame manipulation
 import numpy        as np       # List manipulation
-from scipy.interpolate import interp1d
-from scipy.integrate import cumtrapz
-import math
 import func
-
-opti = ca.Opti() #Casadi helper classes
+import model
+import cache
+import loads
+import integer
+import jobs
+import metrics
+import sizing
+import sweep
+import warmup
 
 bool_discrete = False
 bool_monotype = False
@@ -25,914 +29,296 @@ st.markdown("""
                 }
         </style>
         """, unsafe_allow_html=True)
+
 #st.header("Discrete HBESS Sizing using CasADi optimization:zap:")
 layout = st.columns([3, 5], gap="large")
 layout_left = layout[0].columns(2, gap="large")
-tabs = layout[1].tabs(["Primary Load Profile", "Secondary Load Profile"])
-layout_right_primary = tabs[0].columns(2, gap="large")
-layout_right_secondary = tabs[1].columns(2, gap="large")
 layout_left[0].write("**High Energy Cell**")
 layout_left[1].write("**High Power Cell**")
-placeholder_right_primary = layout_right_primary[0].empty()
-placeholder_right_secondary = layout_right_secondary[0].empty()
 
 # User inputs - High Energy Battery
-Q_cell_HE = layout_left[0].number_input("Rated capacity (Ah)", value=50)        # Ah 94
-V_cell_HE = layout_left[0].number_input("Nominal voltage (V)", value=3.67, disabled=True)      # V
-I_cell_HE = layout_left[0].number_input("Maximum current (A)", value=50)       # A 150
-C_cell_HE = layout_left[0].number_input("Cost (€)", value=27)                   # € 62
-E_cell_HE = (Q_cell_HE/1000) * V_cell_HE                                        # kWh
-OCV_HE = [3.427, 3.508, 3.588, 3.621, 3.647, 3.684, 3.761, 3.829, 3.917, 4.019, 4.135]
-OCV_SOC_HE = [0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1];
+Q_cell_HE = layout_left[0].number_input("Rated capacity (Ah)", value=sizing.CELL_HE['Q'])        # Ah 94
+V_cell_HE = layout_left[0].number_input("Nominal voltage (V)", value=sizing.CELL_HE['V'], disabled=True)      # V
+I_cell_HE = layout_left[0].number_input("Maximum current (A)", value=sizing.CELL_HE['I'])       # A 150
+C_cell_HE = layout_left[0].number_input("Cost (€)", value=sizing.CELL_HE['C'])                   # € 62
+OCV_HE = sizing.CELL_HE['OCV']
+OCV_SOC_HE = sizing.CELL_HE['OCV_SOC']
 
 
 # User inputs - High Power Battery
-Q_cell_HP = layout_left[1].number_input('Rated capacity (Ah)', value=23)        # Ah
-V_cell_HP = layout_left[1].number_input('Nominal voltage (V)', value=2.3, disabled=True)       # V
-I_cell_HP = layout_left[1].number_input('Maximum current (A)', value=92)        # A
-C_cell_HP = layout_left[1].number_input('Cost (€)', value=20)                   # € 38
-E_cell_HP = (Q_cell_HP/1000) * V_cell_HP                                        # kWh 
-OCV_HP = [2.067, 2.113, 2.151, 2.183, 2.217, 2.265, 2.326, 2.361, 2.427, 2.516, 2.653]
-OCV_SOC_HP = [0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1]
-V_pack = layout[0].slider('Nominal Pack Voltage _(V)_', min_value=0, max_value=2000 ,value=1000)
+Q_cell_HP = layout_left[1].number_input('Rated capacity (Ah)', value=sizing.CELL_HP['Q'])        # Ah
+V_cell_HP = layout_left[1].number_input('Nominal voltage (V)', value=sizing.CELL_HP['V'], disabled=True)       # V
+I_cell_HP = layout_left[1].number_input('Maximum current (A)', value=sizing.CELL_HP['I'])        # A
+C_cell_HP = layout_left[1].number_input('Cost (€)', value=sizing.CELL_HP['C'])                   # € 38
+OCV_HP = sizing.CELL_HP['OCV']
+OCV_SOC_HP = sizing.CELL_HP['OCV_SOC']
+V_pack = layout[0].slider('Nominal Pack Voltage _(V)_', min_value=0, max_value=2000 ,value=sizing.V_PACK)
 layout_left = layout[0].columns(2, gap="large")
 #bool_voltage = layout_left[0].checkbox('Manually set Pack Voltage')
 bool_voltage = True
 bool_neg = layout_left[0].checkbox('Allow packs to charge each other')
 bool_monotype = layout_left[0].checkbox('Also calculate monotypes', help='Increases calculation time!')
-bool_discrete = layout_left[0].checkbox('Discrete solution', help='Increases calculation time!')
-#bool_OCV = layout_left[0].checkbox('Constant pack voltage')
-bool_OCV = False
+bool_discrete = layout_left[0].checkbox('Discrete solution', help='Branch-and-bound over integer series/parallel counts, increases calculation time!')
+bool_OCV = layout_left[0].checkbox('Constant pack voltage', help='Cell voltage fixed at its nominal value, the sizing is then linear and solved in milliseconds')
+bool_warm = layout_left[0].checkbox('Warm start', value=True, help='Start from the previous solution of this session')
+bool_merge = layout_left[0].checkbox('Merge constant-power samples', value=True, help='Runs of equal power become one time step, same optimum with fewer variables')
+bool_compiled = layout_left[0].checkbox('Compiled solver', help='First run per profile length compiles a C library, later runs reuse it')
 run = layout_left[1].button('Run CasADi optimization')
+factor = layout_left[1].number_input('Downsampling factor', min_value=1, value=1,
+                                     help='Bins of this many samples keep their peak powers and energy, N shrinks about factor/3 times')
+time_limit = layout_left[1].number_input('Integer search time limit (s)', min_value=1, value=integer.TIME_LIMIT, disabled=not bool_discrete)
+bool_error = layout_left[1].checkbox('Compare with full resolution', disabled=factor == 1,
+                                     help='Solves the hybrid problem again on the original profiles and reports the cost error')
+solver_layout = layout[0].expander('Solver')
+solver_left = solver_layout.columns(2)
+backend = solver_left[0].selectbox('Backend', model.BACKENDS, help='NLP solvers bundled with CasADi')
+linear_solver = solver_left[0].selectbox('Linear solver', model.get_linear_solvers(), disabled=backend != 'ipopt',
+                                         help='HSL solvers are listed when libhsl is installed')
+hessian = solver_left[0].selectbox('Hessian', model.HESSIANS, help='limited-memory: L-BFGS approximation, cheaper iterations but more of them')
+tol = solver_left[1].number_input('Tolerance', min_value=1e-14, max_value=1e-2, value=model.SOLVER['tol'], format='%.0e')
+max_iter = solver_left[1].number_input('Iteration limit', min_value=1, value=model.SOLVER['max_iter'])
+verbose = solver_left[1].checkbox('Solver log on the console', help='Printing the log takes time on long runs')
+solver = dict(backend=backend, linear_solver=linear_solver, hessian=hessian, tol=tol, max_iter=max_iter, verbose=verbose)
+sweep_layout = layout[0].expander('Voltage sweep')
+V_sweep = sweep_layout.slider('Pack voltage range _(V)_', min_value=100, max_value=2000, value=(400, 1600))
+V_step = sweep_layout.number_input('Step (V)', min_value=1, value=50)
+run_sweep = sweep_layout.button('Run voltage sweep', help='Hybrid solves over the range on all CPU cores')
+uploads = layout[0].file_uploader('Additional load profiles', type='csv', accept_multiple_files=True,
+                                  help='Columns "time (s)" and "power (W)", each file is sized for together with the bundled profiles')
 #V_pack = layout_left[1].number_input('Nominal Pack Voltage (V)', value=600, disabled= not bool_voltage)
 #V_pack = V_pack if bool_voltage else 0;
 
 #layout[0].divider()
 
-# User inputs - Primary Load Profile
-df_load_primary = pd.read_csv("tug_boat_1.csv")
-df_load_primary.rename(columns={'time (s)': 't', 'power (W)': 'P'}, inplace=True)
-t_primary       = df_load_primary['t'].values
-P_primary       = df_load_primary['P'].values
-N_primary       = t_primary.shape[0]
-figure = func.plot_power(df_load_primary)
-placeholder_right_primary.altair_chart(figure, use_container_width=True)
-
-# User inputs - Secondary Load Profile
-df_load_secondary = pd.read_csv("tug_boat_2.csv")   # W vs s
-df_load_secondary.rename(columns={'time (s)': 't', 'power (W)': 'P'}, inplace=True)
-t_secondary       = df_load_secondary['t'].values
-P_secondary       = df_load_secondary['P'].values
-N_secondary       = t_secondary.shape[0]
-figure = func.plot_power(df_load_secondary)
-placeholder_right_secondary.altair_chart(figure, use_container_width=True)
-
-#########################################################################################
-if run:
-    with st.spinner('Calculating...'):
-        # Define the decision variables
-        P_HE_1 = opti.variable(N_primary, 1)
-        P_HE_2 = opti.variable(N_secondary, 1)
-        SERIES_HE = opti.variable(1, 1)
-        PARALLEL_HE = opti.variable(1, 1)
-        SOC_HE_1 = opti.variable(N_primary+1, 1)
-        I_HE_1 = opti.variable(N_primary, 1)
-        SOC_HE_2 = opti.variable(N_secondary+1, 1)
-        I_HE_2 = opti.variable(N_secondary, 1)
-
-        P_HP_1 = opti.variable(N_primary, 1)
-        P_HP_2 = opti.variable(N_secondary, 1)
-        SERIES_HP = opti.variable(1, 1)
-        PARALLEL_HP = opti.variable(1, 1)
-        SOC_HP_1 = opti.variable(N_primary+1, 1)
-        I_HP_1 = opti.variable(N_primary, 1)
-        SOC_HP_2 = opti.variable(N_secondary+1, 1)
-        I_HP_2 = opti.variable(N_secondary, 1)
-
-        # Define the objective function
-        objective = C_cell_HE * SERIES_HE * PARALLEL_HE + C_cell_HP * SERIES_HP * PARALLEL_HP   # Total cost of the battery system (eur)
-
-        # Define the constraints
-        opti.subject_to(P_HE_1 + P_HP_1 == P_primary)
-        opti.subject_to(P_HE_2 + P_HP_2 == P_secondary)
-
-        if bool_voltage:
-            opti.subject_to(SERIES_HE == round(V_pack / V_cell_HE))
-            opti.subject_to(SERIES_HP == round(V_pack / V_cell_HP))
-
-        opti.subject_to(SERIES_HE >= 0)
-        opti.subject_to(PARALLEL_HE >= 0)
-        #opti.subject_to(ca.remainder(SERIES_HE, 1) == 0)
-        #opti.subject_to(ca.remainder(PARALLEL_HE, 1) == 0)
-        if not bool_neg:
-            opti.subject_to(P_HP_1 >= 0)
-            opti.subject_to(P_HP_2 >= 0)
-            opti.subject_to(P_HE_1 >= 0)
-            opti.subject_to(P_HE_2 >= 0)
-
-        opti.subject_to(SERIES_HP >= 0)
-        opti.subject_to(PARALLEL_HP >= 0)
-        #opti.subject_to(ca.remainder(SERIES_HP, 1) == 0)
-        #opti.subject_to(ca.remainder(PARALLEL_HP, 1) == 0)
-        
-
-        # Define the SOC related parameters
-        t_SOC_1 = df_load_primary['t'].tolist()
-        t_SOC_1.append(t_SOC_1[-1] + (t_SOC_1[-1] - t_SOC_1[-2]))
-        SOC_HE_1[0]=ca.DM(0.9)
-        SOC_HP_1[0]=ca.DM(0.9)
-
-        for i in range(0, N_primary):
-                E_HE = SERIES_HE * PARALLEL_HE * E_cell_HE
-                E_HP = SERIES_HP * PARALLEL_HP * E_cell_HP
-                opti.subject_to(SOC_HE_1[i+1] == SOC_HE_1[i] - func.get_SOC(P_HE_1[i], E_HE,t_SOC_1[i+1] - t_SOC_1[i]))
-                opti.subject_to(SOC_HP_1[i+1] == SOC_HP_1[i] - func.get_SOC(P_HP_1[i], E_HP,t_SOC_1[i+1] - t_SOC_1[i]))
-
-        opti.subject_to(opti.bounded(0.1, SOC_HE_1, 0.9))
-        opti.subject_to(opti.bounded(0.1, SOC_HP_1, 0.9))
-
-        t_SOC_2 = df_load_secondary['t'].tolist()
-        t_SOC_2.append(t_SOC_2[-1] + (t_SOC_2[-1] - t_SOC_2[-2]))
-        SOC_HE_2[0]=ca.DM(0.9)
-        SOC_HP_2[0]=ca.DM(0.9)
-
-        for i in range(0, N_secondary):
-                E_HE = SERIES_HE * PARALLEL_HE * E_cell_HE
-                E_HP = SERIES_HP * PARALLEL_HP * E_cell_HP
-                opti.subject_to(SOC_HE_2[i+1] == SOC_HE_2[i] - func.get_SOC(P_HE_2[i], E_HE,t_SOC_2[i+1] - t_SOC_2[i]))
-                opti.subject_to(SOC_HP_2[i+1] == SOC_HP_2[i] - func.get_SOC(P_HP_2[i], E_HP,t_SOC_2[i+1] - t_SOC_2[i]))
-
-        opti.subject_to(opti.bounded(0.1, SOC_HE_2, 0.9))
-        opti.subject_to(opti.bounded(0.1, SOC_HP_2, 0.9))
-
-        # Define the voltage and current related parameters
-        SOC_TO_OCV_HE = ca.interpolant('LUT','bspline',[OCV_SOC_HE], OCV_HE)
-        SOC_TO_OCV_HP = ca.interpolant('LUT','bspline',[OCV_SOC_HP], OCV_HP)
-
-        for i in range(0, N_primary):
-                if not bool_OCV:
-                    V_HE = (SERIES_HE * SOC_TO_OCV_HE(SOC_HE_1[i]))
-                    V_HP = (SERIES_HP * SOC_TO_OCV_HP(SOC_HP_1[i]))
-                else:
-                    V_HE = SERIES_HE * V_cell_HE
-                    V_HP = SERIES_HE * V_cell_HP
-                opti.subject_to(I_HE_1[i] == P_HE_1[i] / V_HE)
-                opti.subject_to(I_HP_1[i] == P_HP_1[i] / V_HP)
-
-        opti.subject_to(I_HE_1 <= (PARALLEL_HE * I_cell_HE))
-        opti.subject_to(I_HP_1 <= (PARALLEL_HP * I_cell_HP))
-
-        for i in range(0, N_secondary):
-                if not bool_OCV:
-                    V_HE = (SERIES_HE * SOC_TO_OCV_HE(SOC_HE_2[i]))
-                    V_HP = (SERIES_HP * SOC_TO_OCV_HP(SOC_HP_2[i]))
-                else:
-                    V_HE = SERIES_HE * V_cell_HE
-                    V_HP = SERIES_HE * V_cell_HP
-                     
-                opti.subject_to(I_HE_2[i] == P_HE_2[i] / V_HE)
-                opti.subject_to(I_HP_2[i] == P_HP_2[i] / V_HP)
-
-        opti.subject_to(I_HE_2 <= (PARALLEL_HE * I_cell_HE))
-        opti.subject_to(I_HP_2 <= (PARALLEL_HP * I_cell_HP))
-
-        # Set initial values
-        if bool_voltage:
-            opti.set_initial(SERIES_HE, round(V_pack / V_cell_HE))  # Set initial value of E_HE
-            opti.set_initial(SERIES_HP, round(V_pack / V_cell_HP))  # Set initial value of E_HE
-            
-        else:
-            opti.set_initial(SERIES_HE, 1)  # Set initial value of E_HE
-            opti.set_initial(SERIES_HP, 1)  # Set initial value of E_HE
-        opti.set_initial(PARALLEL_HE, 16)
-        opti.set_initial(PARALLEL_HP, 25)
-
-        # Define the solver and solve the problem
-        opti.minimize(objective)
-        options = {"ipopt": {"print_level": 5}}
-        opti.solver('ipopt', options)
-        sol = opti.solve()
-
-        ###########################################
-
-    layout[0].subheader(f"Optimal total cost: :green[**{'€ {:,.2f}'.format(sol.value(objective))} €**]")
-    layout_left = layout[0].columns(2, gap="large")
-
-    pack_HE = { 'parameter': ['series', 'parallel', 'total energy', 'nominal voltage', 'maximum current', 'rated current', 'total cost'],
-                'value': [round(sol.value(SERIES_HE), 2), round(sol.value(PARALLEL_HE), 2), f'{round(sol.value(SERIES_HE)*sol.value(PARALLEL_HE)*E_cell_HE, 2)} kWh', f'{round(sol.value(SERIES_HE) * V_cell_HE, 2)} V',
-                f'{round(max(max(sol.value(I_HE_1)), max(sol.value(I_HE_2))), 2)} A', f'{round(sol.value(PARALLEL_HE) * sol.value(I_cell_HE), 2)} A', f'{round(sol.value(SERIES_HE)*sol.value(PARALLEL_HE)*C_cell_HE, 2)} €']
-    }
-
-    pack_HP = { 'parameter': ['series', 'parallel', 'total energy', 'nominal voltage', 'maximum current', 'rated current', 'total cost'],
-                'value': [round(sol.value(SERIES_HP), 2), round(sol.value(PARALLEL_HP), 2), f'{round(sol.value(SERIES_HP)*sol.value(PARALLEL_HP)*E_cell_HP, 2)} kWh', f'{round(sol.value(SERIES_HP) * V_cell_HP, 2)} V',
-                f'{round(max(max(sol.value(I_HP_1)), max(sol.value(I_HP_2))), 2)} A', f'{round(sol.value(PARALLEL_HP) * sol.value(I_cell_HP), 2)} A', f'{round(sol.value(SERIES_HP)*sol.value(PARALLEL_HP)*C_cell_HP, 2)} €']
-    }
-
-    df_pack_HE = pd.DataFrame(pack_HE)
-    df_pack_HP = pd.DataFrame(pack_HP)
-    layout_left[0].table(func.display_pack(df_pack_HE))
-    layout_left[1].table(func.display_pack(df_pack_HP))
-
-
-
-    # Plot the power profiles
-    placeholder_right_primary.empty()
-    placeholder_right_secondary.empty()
-
-    df_loads_primary = pd.DataFrame(dict(t = t_primary,
-                            P = P_primary,
-                            P_HE = sol.value(P_HE_1),
-                            P_HP = sol.value(P_HP_1)))
-    
-    df_loads_secondary = pd.DataFrame(dict(t = t_secondary,
-                            P = P_secondary,
-                            P_HE = sol.value(P_HE_2),
-                            P_HP = sol.value(P_HP_2)))
-
-    figure = func.plot_powers(df_loads_primary)
-    layout_right_primary[0].altair_chart(figure, use_container_width=True)
-    figure = func.plot_powers(df_loads_secondary)
-    layout_right_secondary[0].altair_chart(figure, use_container_width=True)
-
-    # Plot the SOC
-    df_SOC_1 = pd.DataFrame(dict(t = t_SOC_1,
-                            SOC_HE = sol.value(SOC_HE_1),
-                            SOC_HP = sol.value(SOC_HP_1),))
-    
-    df_SOC_2 = pd.DataFrame(dict(t = t_SOC_2,
-                            SOC_HE = sol.value(SOC_HE_2),
-                            SOC_HP = sol.value(SOC_HP_2),))
-
-    figure = func.plot_SOC(df_SOC_1)
-    layout_right_primary[1].altair_chart(figure, use_container_width=True)
-    figure = func.plot_SOC(df_SOC_2)
-    layout_right_secondary[1].altair_chart(figure, use_container_width=True)
-
-    # Plot the current
-    df_current_1 = pd.DataFrame(dict(t = t_primary,
-                            I_HE = sol.value(I_HE_1),
-                            I_HP = sol.value(I_HP_1)))
-    
-    df_current_2 = pd.DataFrame(dict(t = t_secondary,
-                            I_HE = sol.value(I_HE_2),
-                            I_HP = sol.value(I_HP_2)))
-
-    figure = func.plot_currents(df_current_1)
-    layout_right_primary[1].altair_chart(figure, use_container_width=True)
-    figure = func.plot_currents(df_current_2)
-    layout_right_secondary[1].altair_chart(figure, use_container_width=True)
-
-    # Plot the voltage
-    SOC_TO_OCV_HE = interp1d(OCV_SOC_HE, OCV_HE, kind='linear', fill_value='extrapolate')
-    SOC_TO_OCV_HP = interp1d(OCV_SOC_HP, OCV_HP, kind='linear', fill_value='extrapolate')
-    
-    df_voltage_1 = df_SOC_1[['t']].copy()
-
-    if not bool_OCV:
-        df_voltage_1['V_HE'] = df_SOC_1['SOC_HE'].apply(lambda soc: SOC_TO_OCV_HE(soc))
-        df_voltage_1['V_HP'] = df_SOC_1['SOC_HP'].apply(lambda soc: SOC_TO_OCV_HP(soc))
-    else:
-        df_voltage_1['V_HE'] = V_cell_HE
-        df_voltage_1['V_HP'] = V_cell_HP
-
-    df_voltage_1['V_HE'] *= round(sol.value(SERIES_HE))
-    df_voltage_1['V_HP'] *= round(sol.value(SERIES_HP))
-
-    df_voltage_2 = df_SOC_2[['t']].copy()
-
-    if not bool_OCV:
-        df_voltage_2['V_HE'] = df_SOC_2['SOC_HE'].apply(lambda soc: SOC_TO_OCV_HE(soc))
-        df_voltage_2['V_HP'] = df_SOC_2['SOC_HP'].apply(lambda soc: SOC_TO_OCV_HP(soc))
-    else:
-        df_voltage_2['V_HE'] = V_cell_HE
-        df_voltage_2['V_HP'] = V_cell_HP
-
-    df_voltage_2['V_HE'] *= round(sol.value(SERIES_HE))
-    df_voltage_2['V_HP'] *= round(sol.value(SERIES_HP))
-
-    figure = func.plot_voltages(df_voltage_1)
-    layout_right_primary[0].altair_chart(figure, use_container_width=True)
-    figure = func.plot_voltages(df_voltage_2)
-    layout_right_secondary[0].altair_chart(figure, use_container_width=True)
-
-
-
-
-
-##MONOTYPE##################
-    if bool_monotype:
-        with st.spinner('Calculating...'):
-            # Define the decision variables
-            P_HE_1 = opti.variable(N_primary, 1)
-            P_HE_2 = opti.variable(N_secondary, 1)
-            SERIES_HE = opti.variable(1, 1)
-            PARALLEL_HE = opti.variable(1, 1)
-            SOC_HE_1 = opti.variable(N_primary+1, 1)
-            I_HE_1 = opti.variable(N_primary, 1)
-            SOC_HE_2 = opti.variable(N_secondary+1, 1)
-            I_HE_2 = opti.variable(N_secondary, 1)
-
-            # Define the objective function
-            objective = C_cell_HE * SERIES_HE * PARALLEL_HE 
-            # Define the constraints
-            opti.subject_to(P_HE_1 == P_primary)
-            opti.subject_to(P_HE_2 == P_secondary)
-    
-            if bool_voltage:
-                opti.subject_to(SERIES_HE == round(V_pack / V_cell_HE))
-
-            opti.subject_to(SERIES_HE >= 0)
-            opti.subject_to(PARALLEL_HE >= 0)
-
-            if not bool_neg:
-                opti.subject_to(P_HE_1 >= 0)
-                opti.subject_to(P_HE_2 >= 0)
-          
-            # Define the SOC related parameters
-            t_SOC_1 = df_load_primary['t'].tolist()
-            t_SOC_1.append(t_SOC_1[-1] + (t_SOC_1[-1] - t_SOC_1[-2]))
-            SOC_HE_1[0]=ca.DM(0.9)
-
-            for i in range(0, N_primary):
-                    E_HE = SERIES_HE * PARALLEL_HE * E_cell_HE
-                    opti.subject_to(SOC_HE_1[i+1] == SOC_HE_1[i] - func.get_SOC(P_HE_1[i], E_HE,t_SOC_1[i+1] - t_SOC_1[i]))
-
-            opti.subject_to(opti.bounded(0.1, SOC_HE_1, 0.9))
-
-            t_SOC_2 = df_load_secondary['t'].tolist()
-            t_SOC_2.append(t_SOC_2[-1] + (t_SOC_2[-1] - t_SOC_2[-2]))
-            SOC_HE_2[0]=ca.DM(0.9)
-
-            for i in range(0, N_secondary):
-                    E_HE = SERIES_HE * PARALLEL_HE * E_cell_HE
-                    opti.subject_to(SOC_HE_2[i+1] == SOC_HE_2[i] - func.get_SOC(P_HE_2[i], E_HE,t_SOC_2[i+1] - t_SOC_2[i]))
-
-            opti.subject_to(opti.bounded(0.1, SOC_HE_2, 0.9))
-
-            # Define the voltage and current related parameters
-            SOC_TO_OCV_HE = ca.interpolant('LUT','bspline',[OCV_SOC_HE], OCV_HE)
-
-            for i in range(0, N_primary):
-                    if not bool_OCV:
-                        V_HE = (SERIES_HE * SOC_TO_OCV_HE(SOC_HE_1[i]))
-                    else:
-                        V_HE = SERIES_HE * V_cell_HE
-
-                    opti.subject_to(I_HE_1[i] == P_HE_1[i] / V_HE)
-
-            opti.subject_to(I_HE_1 <= (PARALLEL_HE * I_cell_HE))
-
-            for i in range(0, N_secondary):
-                    if not bool_OCV:
-                        V_HE = (SERIES_HE * SOC_TO_OCV_HE(SOC_HE_2[i]))
-                    else:
-                        V_HE = SERIES_HE * V_cell_HE
-                        
-                    opti.subject_to(I_HE_2[i] == P_HE_2[i] / V_HE)
-
-            opti.subject_to(I_HE_2 <= (PARALLEL_HE * I_cell_HE))
-
-            # Set initial values
-            if bool_voltage:
-                opti.set_initial(SERIES_HE, round(V_pack / V_cell_HE))  # Set initial value of E_HE
-                
-            else:
-                opti.set_initial(SERIES_HE, 1)  # Set initial value of E_HE
-            opti.set_initial(PARALLEL_HE, 16)
-
-            # Define the solver and solve the problem
-            opti.minimize(objective)
-            options = {"ipopt": {"print_level": 5}}
-            opti.solver('ipopt', options)
-            sol = opti.solve()
-
-            ###########################################
-
-        layout[0].subheader(f"Optimal total cost: :green[**{'€ {:,.2f}'.format(sol.value(objective))} €**]")
-        layout_left = layout[0].columns(2, gap="large")
-
-        pack_HE = { 'parameter': ['series', 'parallel', 'total energy', 'nominal voltage', 'maximum current', 'rated current', 'total cost'],
-                    'value': [round(sol.value(SERIES_HE), 2), round(sol.value(PARALLEL_HE), 2), f'{round(sol.value(SERIES_HE)*sol.value(PARALLEL_HE)*E_cell_HE, 2)} kWh', f'{round(sol.value(SERIES_HE) * V_cell_HE, 2)} V',
-                    f'{round(max(max(sol.value(I_HE_1)), max(sol.value(I_HE_2))), 2)} A', f'{round(sol.value(PARALLEL_HE) * sol.value(I_cell_HE), 2)} A', f'{round(sol.value(SERIES_HE)*sol.value(PARALLEL_HE)*C_cell_HE, 2)} €']
-        }
-
-        df_pack_HE = pd.DataFrame(pack_HE)
-        layout_left[0].table(func.display_pack(df_pack_HE))
-
-
-
-        # Plot the power profiles
-        placeholder_right_primary.empty()
-        placeholder_right_secondary.empty()
-
-        df_loads_primary = pd.DataFrame(dict(t = t_primary,
-                                P = P_primary,
-                                P_HE = sol.value(P_HE_1),
-                                P_HP = sol.value(P_HE_1)))
-        
-        df_loads_secondary = pd.DataFrame(dict(t = t_secondary,
-                                P = P_secondary,
-                                P_HE = sol.value(P_HE_2),
-                                P_HP = sol.value(P_HE_2)))
-
-        figure = func.plot_powers(df_loads_primary)
-        layout_right_primary[0].altair_chart(figure, use_container_width=True)
-        figure = func.plot_powers(df_loads_secondary)
-        layout_right_secondary[0].altair_chart(figure, use_container_width=True)
-
-        # Plot the SOC
-        df_SOC_1 = pd.DataFrame(dict(t = t_SOC_1,
-                                SOC_HE = sol.value(SOC_HE_1),
-                                SOC_HP = sol.value(SOC_HE_1),))
-        
-        df_SOC_2 = pd.DataFrame(dict(t = t_SOC_2,
-                                SOC_HE = sol.value(SOC_HE_2),
-                                SOC_HP = sol.value(SOC_HE_2),))
-
-        figure = func.plot_SOC(df_SOC_1)
-        layout_right_primary[1].altair_chart(figure, use_container_width=True)
-        figure = func.plot_SOC(df_SOC_2)
-        layout_right_secondary[1].altair_chart(figure, use_container_width=True)
-
-        # Plot the current
-        df_current_1 = pd.DataFrame(dict(t = t_primary,
-                                I_HE = sol.value(I_HE_1),
-                                I_HP = sol.value(I_HE_1)))
-        
-        df_current_2 = pd.DataFrame(dict(t = t_secondary,
-                                I_HE = sol.value(I_HE_2),
-                                I_HP = sol.value(I_HE_2)))
-
-        figure = func.plot_currents(df_current_1)
-        layout_right_primary[1].altair_chart(figure, use_container_width=True)
-        figure = func.plot_currents(df_current_2)
-        layout_right_secondary[1].altair_chart(figure, use_container_width=True)
-
-
-        ########### MONOTYPE HP ##########""
-
+# User inputs - Load Profiles, one tab per scenario
+def get_scenarios(factor):
+    scenarios = [loads.get_scenario(name, loads.read_profile(path, factor), bool_merge) for name, path in loads.PROFILES]
+    scenarios += [loads.get_scenario(upload.name, loads.read_upload(upload, factor), bool_merge) for upload in uploads or []]
+    return scenarios
+
+scenarios = get_scenarios(factor)
+tabs = layout[1].tabs([scenario['name'] for scenario in scenarios])
+layout_right = [tab.columns(2, gap="large") for tab in tabs]
+placeholder_right = [columns[0].empty() for columns in layout_right]
+for scenario, placeholder in zip(scenarios, placeholder_right):
+    figure = cache.charts.get_or_create(('plot_power', cache.get_hash(scenario['df'])), lambda: func.plot_power(scenario['df']))
+    placeholder.altair_chart(figure, use_container_width=True)
+
+cell_HE = sizing.get_cell(sizing.CELL_HE, Q=Q_cell_HE, V=V_cell_HE, I=I_cell_HE, C=C_cell_HE)
+cell_HP = sizing.get_cell(sizing.CELL_HP, Q=Q_cell_HP, V=V_cell_HP, I=I_cell_HP, C=C_cell_HP)
+profiles = [(scenario['t'], scenario['P']) for scenario in scenarios]
+t_SOC = [model.get_t_SOC(t) for t, _ in profiles]
+SOC_TO_OCV_HE = lambda SOC: np.interp(SOC, OCV_SOC_HE, OCV_HE)      # SOC stays within the table
+SOC_TO_OCV_HP = lambda SOC: np.interp(SOC, OCV_SOC_HP, OCV_HP)
+
+# Problems are built once per structure and kept per session, or per worker process when solves
+# run in processes (jobs.PROCESSES); results are shared by all sessions
+case = sizing.Sizing(cell_HE, cell_HP, profiles, V_pack, bool_neg, bool_OCV, bool_voltage, solver, bool_compiled, bool_warm,
+                     problems=st.session_state.setdefault('problems', cache.LRUCache(cache.PROBLEM_CACHE_SIZE)),
+                     processes=jobs.PROCESSES)
+user = st.session_state.setdefault('user', uuid.uuid4().hex)       # queue turns are taken per browser session
+
+def get_tasks():
+    # Solves of one run in display order, as (name, key, solve(monitor)) for the shared queue;
+    # the key is that of the result store, so equal solves of other sessions are merged.
+    # They are independent and run at once up to the worker count, except for the integer
+    # search, which starts from the hybrid result.
+    tasks = [('hybrid', case.get_key('hybrid'), lambda monitor: case.solve('hybrid', monitor=monitor))]
+    if factor > 1 and bool_error:
+        # Same problem on the original profiles, to quantify the downsampling error
+        profiles_full = [(scenario['t'], scenario['P']) for scenario in get_scenarios(1)]
+        tasks.append(('hybrid (full resolution)', case.get_key('hybrid', profiles=profiles_full),
+                      lambda monitor: case.solve('hybrid', profiles=profiles_full, monitor=monitor)))
     if bool_monotype:
-        with st.spinner('Calculating...'):
-            # Define the decision variables
-            P_HP_1 = opti.variable(N_primary, 1)
-            P_HP_2 = opti.variable(N_secondary, 1)
-            SERIES_HP = opti.variable(1, 1)
-            PARALLEL_HP = opti.variable(1, 1)
-            SOC_HP_1 = opti.variable(N_primary+1, 1)
-            I_HP_1 = opti.variable(N_primary, 1)
-            SOC_HP_2 = opti.variable(N_secondary+1, 1)
-            I_HP_2 = opti.variable(N_secondary, 1)
-
-            # Define the objective function
-            objective = C_cell_HP * SERIES_HP * PARALLEL_HP   # Total cost of the battery system (eur)
-
-            # Define the constraints
-            opti.subject_to(P_HP_1 == P_primary)
-            opti.subject_to(P_HP_2 == P_secondary)
-
-            if bool_voltage:
-                opti.subject_to(SERIES_HP == round(V_pack / V_cell_HP))
-
-            if not bool_neg:
-                opti.subject_to(P_HP_1 >= 0)
-                opti.subject_to(P_HP_2 >= 0)
-
-            opti.subject_to(SERIES_HP >= 0)
-            opti.subject_to(PARALLEL_HP >= 0)
-         
-            # Define the SOC related parameters
-            t_SOC_1 = df_load_primary['t'].tolist()
-            t_SOC_1.append(t_SOC_1[-1] + (t_SOC_1[-1] - t_SOC_1[-2]))
-            SOC_HP_1[0]=ca.DM(0.9)
-
-            for i in range(0, N_primary):
-                    E_HP = SERIES_HP * PARALLEL_HP * E_cell_HP
-                    opti.subject_to(SOC_HP_1[i+1] == SOC_HP_1[i] - func.get_SOC(P_HP_1[i], E_HP,t_SOC_1[i+1] - t_SOC_1[i]))
-
-            opti.subject_to(opti.bounded(0.1, SOC_HP_1, 0.9))
-
-            t_SOC_2 = df_load_secondary['t'].tolist()
-            t_SOC_2.append(t_SOC_2[-1] + (t_SOC_2[-1] - t_SOC_2[-2]))
-            SOC_HP_2[0]=ca.DM(0.9)
-
-            for i in range(0, N_secondary):
-                    E_HP = SERIES_HP * PARALLEL_HP * E_cell_HP
-                    opti.subject_to(SOC_HP_2[i+1] == SOC_HP_2[i] - func.get_SOC(P_HP_2[i], E_HP,t_SOC_2[i+1] - t_SOC_2[i]))
-
-            opti.subject_to(opti.bounded(0.1, SOC_HP_2, 0.9))
-
-            # Define the voltage and current related parameters
-            SOC_TO_OCV_HP = ca.interpolant('LUT','bspline',[OCV_SOC_HP], OCV_HP)
-
-            for i in range(0, N_primary):
-                    if not bool_OCV:
-                        V_HP = (SERIES_HP * SOC_TO_OCV_HP(SOC_HP_1[i]))
-                    else:
-                        V_HP = SERIES_HE * V_cell_HP
-                    opti.subject_to(I_HP_1[i] == P_HP_1[i] / V_HP)
-
-            opti.subject_to(I_HP_1 <= (PARALLEL_HP * I_cell_HP))
-
-            for i in range(0, N_secondary):
-                    if not bool_OCV:
-                        V_HP = (SERIES_HP * SOC_TO_OCV_HP(SOC_HP_2[i]))
-                    else:
-                        V_HP = SERIES_HE * V_cell_HP
-                        
-                    opti.subject_to(I_HP_2[i] == P_HP_2[i] / V_HP)
-
-            opti.subject_to(I_HP_2 <= (PARALLEL_HP * I_cell_HP))
-
-            # Set initial values
-            if bool_voltage:
-                opti.set_initial(SERIES_HP, round(V_pack / V_cell_HP))  # Set initial value of E_HE
-                
-            else:
-                opti.set_initial(SERIES_HP, 1)  # Set initial value of E_HE
-            opti.set_initial(PARALLEL_HP, 25)
-
-            # Define the solver and solve the problem
-            opti.minimize(objective)
-            options = {"ipopt": {"print_level": 5}}
-            opti.solver('ipopt', options)
-            sol = opti.solve()
-
-            ###########################################
-
-        layout[0].subheader(f"Optimal total cost: :green[**{'€ {:,.2f}'.format(sol.value(objective))} €**]")
-        layout_left = layout[0].columns(2, gap="large")
-
-        pack_HP = { 'parameter': ['series', 'parallel', 'total energy', 'nominal voltage', 'maximum current', 'rated current', 'total cost'],
-                    'value': [round(sol.value(SERIES_HP), 2), round(sol.value(PARALLEL_HP), 2), f'{round(sol.value(SERIES_HP)*sol.value(PARALLEL_HP)*E_cell_HP, 2)} kWh', f'{round(sol.value(SERIES_HP) * V_cell_HP, 2)} V',
-                    f'{round(max(max(sol.value(I_HP_1)), max(sol.value(I_HP_2))), 2)} A', f'{round(sol.value(PARALLEL_HP) * sol.value(I_cell_HP), 2)} A', f'{round(sol.value(SERIES_HP)*sol.value(PARALLEL_HP)*C_cell_HP, 2)} €']
-        }
-
-        df_pack_HP = pd.DataFrame(pack_HP)
-        layout_left[1].table(func.display_pack(df_pack_HP))
-
-
-
-        # Plot the power profiles
-        placeholder_right_primary.empty()
-        placeholder_right_secondary.empty()
-
-        df_loads_primary = pd.DataFrame(dict(t = t_primary,
-                                P = P_primary,
-                                P_HE = sol.value(P_HP_1),
-                                P_HP = sol.value(P_HP_1)))
-        
-        df_loads_secondary = pd.DataFrame(dict(t = t_secondary,
-                                P = P_secondary,
-                                P_HE = sol.value(P_HP_2),
-                                P_HP = sol.value(P_HP_2)))
-
-        figure = func.plot_powers(df_loads_primary)
-        layout_right_primary[0].altair_chart(figure, use_container_width=True)
-        figure = func.plot_powers(df_loads_secondary)
-        layout_right_secondary[0].altair_chart(figure, use_container_width=True)
-
-        # Plot the SOC
-        df_SOC_1 = pd.DataFrame(dict(t = t_SOC_1,
-                                SOC_HE = sol.value(SOC_HP_1),
-                                SOC_HP = sol.value(SOC_HP_1),))
-        
-        df_SOC_2 = pd.DataFrame(dict(t = t_SOC_2,
-                                SOC_HE = sol.value(SOC_HP_2),
-                                SOC_HP = sol.value(SOC_HP_2),))
-
-        figure = func.plot_SOC(df_SOC_1)
-        layout_right_primary[1].altair_chart(figure, use_container_width=True)
-        figure = func.plot_SOC(df_SOC_2)
-        layout_right_secondary[1].altair_chart(figure, use_container_width=True)
-
-        # Plot the current
-        df_current_1 = pd.DataFrame(dict(t = t_primary,
-                                I_HE = sol.value(I_HP_1),
-                                I_HP = sol.value(I_HP_1)))
-        
-        df_current_2 = pd.DataFrame(dict(t = t_secondary,
-                                I_HE = sol.value(I_HP_2),
-                                I_HP = sol.value(I_HP_2)))
-
-        figure = func.plot_currents(df_current_1)
-        layout_right_primary[1].altair_chart(figure, use_container_width=True)
-        figure = func.plot_currents(df_current_2)
-        layout_right_secondary[1].altair_chart(figure, use_container_width=True)
-        
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+        # Single-chemistry problems
+        tasks += [(f'monotype {name}', case.get_key(name), lambda monitor, name=name: case.solve(name, monitor=monitor))
+                  for name in ('HE', 'HP')]
     if bool_discrete:
-        #################
-        sol_series_he = sol.value(SERIES_HE)
-        sol_series_hp = sol.value(SERIES_HP)
-        sol_parallel_he = sol.value(PARALLEL_HE)
-        sol_parallel_hp = sol.value(PARALLEL_HP)
-
-        with st.spinner('Calculating...'):
-            # Define the decision variables
-            P_HE_1 = opti.variable(N_primary, 1)
-            P_HE_2 = opti.variable(N_secondary, 1)
-            SERIES_HE = opti.variable(1, 1)
-            PARALLEL_HE = opti.variable(1, 1)
-            SOC_HE_1 = opti.variable(N_primary+1, 1)
-            I_HE_1 = opti.variable(N_primary, 1)
-            SOC_HE_2 = opti.variable(N_secondary+1, 1)
-            I_HE_2 = opti.variable(N_secondary, 1)
-
-            P_HP_1 = opti.variable(N_primary, 1)
-            P_HP_2 = opti.variable(N_secondary, 1)
-            SERIES_HP = opti.variable(1, 1)
-            PARALLEL_HP = opti.variable(1, 1)
-            SOC_HP_1 = opti.variable(N_primary+1, 1)
-            I_HP_1 = opti.variable(N_primary, 1)
-            SOC_HP_2 = opti.variable(N_secondary+1, 1)
-            I_HP_2 = opti.variable(N_secondary, 1)
-
-            # Define the objective function
-            objective = C_cell_HE * SERIES_HE * PARALLEL_HE + C_cell_HP * SERIES_HP * PARALLEL_HP   # Total cost of the battery system (eur)
-
-            # Define the constraints
-            opti.subject_to(P_HE_1 + P_HP_1 == P_primary)
-            opti.subject_to(P_HE_2 + P_HP_2 == P_secondary)
-
-            # if bool_voltage:
-            #     opti.subject_to(SERIES_HE == round(V_pack / V_cell_HE))
-            #     opti.subject_to(SERIES_HP == round(V_pack / V_cell_HP))
-
-            # opti.subject_to(SERIES_HE >= 0)
-            # opti.subject_to(PARALLEL_HE >= 0)
-            
-            # opti.subject_to(PARALLEL_HP == sol_parallel_hp)
-            # opti.subject_to(PARALLEL_HE == sol_parallel_he)
-            #opti.subject_to(ca.remainder(SERIES_HE, 1) == 0)
-            #opti.subject_to(ca.remainder(PARALLEL_HE, 1) == 0)
-            opti.subject_to(opti.bounded(sol_series_he - 3, SERIES_HE, sol_series_he + 3))
-            opti.subject_to(opti.bounded(sol_series_hp - 3, SERIES_HP, sol_series_hp + 3))
-            opti.subject_to(PARALLEL_HE == round(sol_parallel_he))
-            opti.subject_to(PARALLEL_HP == round(sol_parallel_hp))
-
-
-
-            if not bool_neg:
-                opti.subject_to(P_HP_1 >= 0)
-                opti.subject_to(P_HP_2 >= 0)
-                opti.subject_to(P_HE_1 >= 0)
-                opti.subject_to(P_HE_2 >= 0)
-
-            # opti.subject_to(SERIES_HP >= 0)
-            # opti.subject_to(PARALLEL_HP >= 0)
-            #opti.subject_to(ca.remainder(SERIES_HP, 1) == 0)
-            #opti.subject_to(ca.remainder(PARALLEL_HP, 1) == 0)
-            
-
-            # Define the SOC related parameters
-            t_SOC_1 = df_load_primary['t'].tolist()
-            t_SOC_1.append(t_SOC_1[-1] + (t_SOC_1[-1] - t_SOC_1[-2]))
-            SOC_HE_1[0]=ca.DM(0.9)
-            SOC_HP_1[0]=ca.DM(0.9)
-
-            for i in range(0, N_primary):
-                    E_HE = SERIES_HE * PARALLEL_HE * E_cell_HE
-                    E_HP = SERIES_HP * PARALLEL_HP * E_cell_HP
-                    opti.subject_to(SOC_HE_1[i+1] == SOC_HE_1[i] - func.get_SOC(P_HE_1[i], E_HE,t_SOC_1[i+1] - t_SOC_1[i]))
-                    opti.subject_to(SOC_HP_1[i+1] == SOC_HP_1[i] - func.get_SOC(P_HP_1[i], E_HP,t_SOC_1[i+1] - t_SOC_1[i]))
-
-            opti.subject_to(opti.bounded(0.1, SOC_HE_1, 0.9))
-            opti.subject_to(opti.bounded(0.1, SOC_HP_1, 0.9))
-
-            t_SOC_2 = df_load_secondary['t'].tolist()
-            t_SOC_2.append(t_SOC_2[-1] + (t_SOC_2[-1] - t_SOC_2[-2]))
-            SOC_HE_2[0]=ca.DM(0.9)
-            SOC_HP_2[0]=ca.DM(0.9)
-
-            for i in range(0, N_secondary):
-                    E_HE = SERIES_HE * PARALLEL_HE * E_cell_HE
-                    E_HP = SERIES_HP * PARALLEL_HP * E_cell_HP
-                    opti.subject_to(SOC_HE_2[i+1] == SOC_HE_2[i] - func.get_SOC(P_HE_2[i], E_HE,t_SOC_2[i+1] - t_SOC_2[i]))
-                    opti.subject_to(SOC_HP_2[i+1] == SOC_HP_2[i] - func.get_SOC(P_HP_2[i], E_HP,t_SOC_2[i+1] - t_SOC_2[i]))
-
-            opti.subject_to(opti.bounded(0.1, SOC_HE_2, 0.9))
-            opti.subject_to(opti.bounded(0.1, SOC_HP_2, 0.9))
-
-            # Define the voltage and current related parameters
-            SOC_TO_OCV_HE = ca.interpolant('LUT','bspline',[OCV_SOC_HE], OCV_HE)
-            SOC_TO_OCV_HP = ca.interpolant('LUT','bspline',[OCV_SOC_HP], OCV_HP)
-
-            for i in range(0, N_primary):
-                    if not bool_OCV:
-                        V_HE = (SERIES_HE * SOC_TO_OCV_HE(SOC_HE_1[i]))
-                        V_HP = (SERIES_HP * SOC_TO_OCV_HP(SOC_HP_1[i]))
-                    else:
-                        V_HE = SERIES_HE * V_cell_HE
-                        V_HP = SERIES_HE * V_cell_HP
-                    opti.subject_to(I_HE_1[i] == P_HE_1[i] / V_HE)
-                    opti.subject_to(I_HP_1[i] == P_HP_1[i] / V_HP)
-
-            opti.subject_to(I_HE_1 <= (PARALLEL_HE * I_cell_HE))
-            opti.subject_to(I_HP_1 <= (PARALLEL_HP * I_cell_HP))
-
-            for i in range(0, N_secondary):
-                    if not bool_OCV:
-                        V_HE = (SERIES_HE * SOC_TO_OCV_HE(SOC_HE_2[i]))
-                        V_HP = (SERIES_HP * SOC_TO_OCV_HP(SOC_HP_2[i]))
-                    else:
-                        V_HE = SERIES_HE * V_cell_HE
-                        V_HP = SERIES_HE * V_cell_HP
-                        
-                    opti.subject_to(I_HE_2[i] == P_HE_2[i] / V_HE)
-                    opti.subject_to(I_HP_2[i] == P_HP_2[i] / V_HP)
-
-            opti.subject_to(I_HE_2 <= (PARALLEL_HE * I_cell_HE))
-            opti.subject_to(I_HP_2 <= (PARALLEL_HP * I_cell_HP))
-
-            # Set initial values
-            if bool_voltage:
-                opti.set_initial(SERIES_HE, round(V_pack / V_cell_HE))  # Set initial value of E_HE
-                opti.set_initial(SERIES_HP, round(V_pack / V_cell_HP))  # Set initial value of E_HE
-                
-            else:
-                opti.set_initial(SERIES_HE, 1)  # Set initial value of E_HE
-                opti.set_initial(SERIES_HP, 1)  # Set initial value of E_HE
-            opti.set_initial(PARALLEL_HE, 16)
-            opti.set_initial(PARALLEL_HP, 25)
-
-            # Define the solver and solve the problem
-            opti.minimize(objective)
-            options = {"ipopt": {"print_level": 5}}
-            opti.solver('ipopt', options)
-            sol = opti.solve()
-
-            ###########################################
-
-        # layout[0].subheader(f"Optimal total cost: :green[**{'€ {:,.2f}'.format(sol.value(objective))} €**]")
-        # layout_left = layout[0].columns(2, gap="large")
-        
-        # pack_HE = { 'parameter': ['series', 'parallel', 'total energy', 'nominal voltage', 'maximum current', 'rated current', 'total cost'],
-        #             'value': [round(sol.value(SERIES_HE), 2), round(sol.value(PARALLEL_HE), 2), f'{round(sol.value(SERIES_HE)*sol.value(PARALLEL_HE)*E_cell_HE, 2)} kWh', f'{round(sol.value(SERIES_HE) * V_cell_HE, 2)} V',
-        #             f'{round(max(max(sol.value(I_HE_1)), max(sol.value(I_HE_2))), 2)} A', f'{round(sol.value(PARALLEL_HE) * sol.value(I_cell_HE), 2)} A', f'{round(sol.value(SERIES_HE)*sol.value(PARALLEL_HE)*C_cell_HE, 2)} €']
-        # }
-
-        # pack_HP = { 'parameter': ['series', 'parallel', 'total energy', 'nominal voltage', 'maximum current', 'rated current', 'total cost'],
-        #             'value': [round(sol.value(SERIES_HP), 2), round(sol.value(PARALLEL_HP), 2), f'{round(sol.value(SERIES_HP)*sol.value(PARALLEL_HP)*E_cell_HP, 2)} kWh', f'{round(sol.value(SERIES_HP) * V_cell_HP, 2)} V',
-        #             f'{round(max(max(sol.value(I_HP_1)), max(sol.value(I_HP_2))), 2)} A', f'{round(sol.value(PARALLEL_HP) * sol.value(I_cell_HP), 2)} A', f'{round(sol.value(SERIES_HP)*sol.value(PARALLEL_HP)*C_cell_HP, 2)} €']
-        # }
-
-        # df_pack_HE = pd.DataFrame(pack_HE)
-        # df_pack_HP = pd.DataFrame(pack_HP)
-        # layout_left[0].table(func.display_pack(df_pack_HE))
-        # layout_left[1].table(func.display_pack(df_pack_HP))
-        
-
+        # Branch-and-bound over the integer series/parallel counts
+        _, key_hybrid, solve_hybrid = tasks[0]
+        seed = lambda monitor: lambda: jobs.get_scheduler().wait(user, key_hybrid, solve_hybrid, monitor)
+        tasks.append(('discrete', case.get_integer_key(time_limit),
+                      lambda monitor: case.solve_integer(time_limit, monitor=monitor, seed=seed(monitor))))
+    return tasks
+
+@st.fragment(run_every=0.5)
+def show_progress(job):
+    # Live view of a running job; the whole page reruns whenever a solve finishes
+    if job.done or len(job.results) != st.session_state.get('shown', 0):
+        st.session_state['shown'] = len(job.results)
+        st.rerun()
+    queued, running = job.scheduler.get_depth()
+    columns = st.columns([4, 1])
+    columns[0].write(f"{len(job.results)} of {len(job.names)} solves done, {time.time() - job.started:.1f} s "
+                     f"(server: {running} running, {queued} queued)")
+    chart = None
+    for name, ticket in job.tickets.items():
+        if ticket.done:
+            continue
+        if ticket.state == 'queued':
+            position, depth = job.scheduler.get_position(ticket)
+            columns[0].write(f"**{name}**: queued, {position or depth} of {depth}")
+            continue
+        history = ticket.monitor.get()
+        if not history:
+            columns[0].write(f"Solving **{name}**...")
+            continue
+        iteration, objective, infeasibility = history[-1]
+        violation = f", constraint violation {infeasibility:.1e}" if infeasibility is not None else ''
+        columns[0].write(f"Solving **{name}**: iteration {iteration}, objective {'€ {:,.2f}'.format(objective)}{violation}")
+        chart = chart or history
+    if chart:
+        st.line_chart(pd.DataFrame(chart, columns=['iteration', 'objective', 'violation']).set_index('iteration')[['objective']],
+                      height=150)
+    if columns[1].button('Cancel', disabled=job.released):
+        job.cancel()
+
+def show_metrics(runs):
+    # Outcome, effort and time per phase of every solve, downloadable for monitoring
+    values = {name: metrics.get_metrics(result) for name, result in runs.items()}
+    columns = ['solver', 'status', 'iterations', 'time', 'variables', 'constraints', 'parameters']
+    metrics_layout = layout[0].expander('Solver statistics')
+    metrics_layout.table(pd.DataFrame({name: {column: value.get(column) for column in columns}
+                                       for name, value in values.items()}).T.rename(columns={'time': 'time (s)'}))
+    phases = {name: value['phases'] for name, value in values.items() if value['phases']}
+    if phases:
+        metrics_layout.caption('Wall time per phase (s)')
+        metrics_layout.table(pd.DataFrame(phases).T)
+    buttons = metrics_layout.columns(2)
+    buttons[0].download_button('JSON', metrics.to_json(runs), file_name='solver_stats.json', mime='application/json')
+    buttons[1].download_button('Prometheus', metrics.to_prometheus(runs), file_name='solver_stats.prom',
+                               mime='text/plain')
+
+def show_pack(column, pack, cell, integer=False):
+    # Sizing table of one pack
+    SERIES, PARALLEL = pack['SERIES'], pack['PARALLEL']
+    I_max = max(max(I) for I in pack['I'])
+    df_pack = pd.DataFrame({ 'parameter': ['series', 'parallel', 'total energy', 'nominal voltage', 'maximum current', 'rated current', 'total cost'],
+                'value': [int(SERIES) if integer else round(SERIES, 2), int(PARALLEL) if integer else round(PARALLEL, 2),
+                f'{round(SERIES*PARALLEL*cell["E"], 2)} kWh', f'{round(SERIES * cell["V"], 2)} V',
+                f'{round(I_max, 2)} A', f'{round(PARALLEL * cell["I"], 2)} A', f'{round(SERIES*PARALLEL*cell["C"], 2)} €']
+    })
+    column.table(func.display_pack(df_pack))
+
+def show_profiles(pack_HE, pack_HP, bool_voltages=True):
+    # Power, SOC, current and pack voltage of every scenario in its own tab;
+    # monotypes pass the same pack twice
+    for k, scenario in enumerate(scenarios):
+        columns = layout_right[k]
+        placeholder_right[k].empty()
 
         # Plot the power profiles
-        placeholder_right_primary.empty()
-        placeholder_right_secondary.empty()
-
-        df_loads_primary = pd.DataFrame(dict(t = t_primary,
-                                P = P_primary,
-                                P_HE = sol.value(P_HE_1),
-                                P_HP = sol.value(P_HP_1)))
-        
-        df_loads_secondary = pd.DataFrame(dict(t = t_secondary,
-                                P = P_secondary,
-                                P_HE = sol.value(P_HE_2),
-                                P_HP = sol.value(P_HP_2)))
-
-        figure = func.plot_powers(df_loads_primary)
-        layout_right_primary[0].altair_chart(figure, use_container_width=True)
-        figure = func.plot_powers(df_loads_secondary)
-        layout_right_secondary[0].altair_chart(figure, use_container_width=True)
+        df_loads = pd.DataFrame(dict(t = scenario['t'],
+                                P = scenario['P'],
+                                P_HE = pack_HE['P'][k],
+                                P_HP = pack_HP['P'][k]))
+        columns[0].altair_chart(func.plot_powers(df_loads), use_container_width=True)
 
         # Plot the SOC
-        df_SOC_1 = pd.DataFrame(dict(t = t_SOC_1,
-                                SOC_HE = sol.value(SOC_HE_1),
-                                SOC_HP = sol.value(SOC_HP_1),))
-        
-        df_SOC_2 = pd.DataFrame(dict(t = t_SOC_2,
-                                SOC_HE = sol.value(SOC_HE_2),
-                                SOC_HP = sol.value(SOC_HP_2),))
-
-        figure = func.plot_SOC(df_SOC_1)
-        layout_right_primary[1].altair_chart(figure, use_container_width=True)
-        figure = func.plot_SOC(df_SOC_2)
-        layout_right_secondary[1].altair_chart(figure, use_container_width=True)
+        df_SOC = pd.DataFrame(dict(t = t_SOC[k],
+                                SOC_HE = pack_HE['SOC'][k],
+                                SOC_HP = pack_HP['SOC'][k]))
+        columns[1].altair_chart(func.plot_SOC(df_SOC), use_container_width=True)
 
         # Plot the current
-        df_current_1 = pd.DataFrame(dict(t = t_primary,
-                                I_HE = sol.value(I_HE_1),
-                                I_HP = sol.value(I_HP_1)))
-        
-        df_current_2 = pd.DataFrame(dict(t = t_secondary,
-                                I_HE = sol.value(I_HE_2),
-                                I_HP = sol.value(I_HP_2)))
-
-        figure = func.plot_currents(df_current_1)
-        layout_right_primary[1].altair_chart(figure, use_container_width=True)
-        figure = func.plot_currents(df_current_2)
-        layout_right_secondary[1].altair_chart(figure, use_container_width=True)
+        df_current = pd.DataFrame(dict(t = scenario['t'],
+                                I_HE = pack_HE['I'][k],
+                                I_HP = pack_HP['I'][k]))
+        columns[1].altair_chart(func.plot_currents(df_current), use_container_width=True)
 
         # Plot the voltage
-        SOC_TO_OCV_HE = interp1d(OCV_SOC_HE, OCV_HE, kind='linear', fill_value='extrapolate')
-        SOC_TO_OCV_HP = interp1d(OCV_SOC_HP, OCV_HP, kind='linear', fill_value='extrapolate')
-        
-        df_voltage_1 = df_SOC_1[['t']].copy()
+        if bool_voltages:
+            df_voltage = df_SOC[['t']].copy()
+            if not bool_OCV:
+                df_voltage['V_HE'] = SOC_TO_OCV_HE(df_SOC['SOC_HE'].values)
+                df_voltage['V_HP'] = SOC_TO_OCV_HP(df_SOC['SOC_HP'].values)
+            else:
+                df_voltage['V_HE'] = V_cell_HE
+                df_voltage['V_HP'] = V_cell_HP
+            df_voltage['V_HE'] *= round(pack_HE['SERIES'])
+            df_voltage['V_HP'] *= round(pack_HP['SERIES'])
+            columns[0].altair_chart(func.plot_voltages(df_voltage), use_container_width=True)
 
-        if not bool_OCV:
-            df_voltage_1['V_HE'] = df_SOC_1['SOC_HE'].apply(lambda soc: SOC_TO_OCV_HE(soc))
-            df_voltage_1['V_HP'] = df_SOC_1['SOC_HP'].apply(lambda soc: SOC_TO_OCV_HP(soc))
+#########################################################################################
+if run_sweep:
+    with st.spinner('Sweeping...'):
+        voltages = np.arange(V_sweep[0], V_sweep[1] + V_step / 2, V_step)
+        df_sweep = sweep.sweep(cell_HE, cell_HP, profiles, voltages, bool_neg, bool_OCV, solver=solver)
+    sweep_layout.altair_chart(func.plot_sweep(df_sweep), use_container_width=True)
+    best = df_sweep.loc[df_sweep['cost'].idxmin()]
+    sweep_layout.write(f"Minimum cost **{'€ {:,.2f}'.format(best['cost'])}** at **{best['V_pack']:.0f} V**")
+
+# Solves of a run are queued as a job on the scheduler shared by all sessions (jobs.py), the page follows it until it is done.
+# The job belongs to the inputs it was started with; once they change, its results are not shown.
+key = cache.get_hash(cell_HE, cell_HP, profiles, V_pack, bool_neg, bool_OCV, bool_monotype, bool_discrete, time_limit,
+                     factor, bool_error, solver)
+if run:
+    if 'job' in st.session_state:
+        st.session_state['job'].cancel()
+    st.session_state['job'] = jobs.Job(key, get_tasks(), model.get_label(solver), user=user)
+    st.session_state['shown'] = 0
+job = st.session_state.get('job')
+if job is not None and job.key != key and not job.done:
+    job.cancel()        # its results would never be shown
+
+if job is not None and job.key == key:
+    results = job.results
+    if not job.done:
+        with layout[0]:
+            show_progress(job)
+    for name, error in job.failures.items():
+        if isinstance(error, model.Cancelled):
+            layout[0].warning(f"{name}: cancelled")
         else:
-            df_voltage_1['V_HE'] = V_cell_HE
-            df_voltage_1['V_HP'] = V_cell_HP
-
-        df_voltage_1['V_HE'] *= round(sol.value(SERIES_HE))
-        df_voltage_1['V_HP'] *= round(sol.value(SERIES_HP))
-
-        df_voltage_2 = df_SOC_2[['t']].copy()
+            layout[0].error(f"{name}, {job.label}: {error}")
+
+    if 'hybrid' in results:
+        result = results['hybrid']
+        if 'hybrid (full resolution)' in results:
+            result_full = results['hybrid (full resolution)']
+            N = sum(len(t) for t, _ in profiles)
+            N_full = sum(len(pack_P) for pack_P in result_full['HE']['P'])
+            layout[0].write(f"Downsampled to {N} of {N_full} samples, cost error "
+                            f"**{result['cost'] / result_full['cost'] - 1:+.3%}** (full resolution {'€ {:,.2f}'.format(result_full['cost'])})")
+
+        layout[0].subheader(f"Optimal total cost: :green[**{'€ {:,.2f}'.format(result['cost'])} €**]")
+        layout_left = layout[0].columns(2, gap="large")
+        show_pack(layout_left[0], result['HE'], cell_HE)
+        show_pack(layout_left[1], result['HP'], cell_HP)
+        show_profiles(result['HE'], result['HP'])
 
-        if not bool_OCV:
-            df_voltage_2['V_HE'] = df_SOC_2['SOC_HE'].apply(lambda soc: SOC_TO_OCV_HE(soc))
-            df_voltage_2['V_HP'] = df_SOC_2['SOC_HP'].apply(lambda soc: SOC_TO_OCV_HP(soc))
+##MONOTYPE##################
+    for name, column, cell in (('HE', 0, cell_HE), ('HP', 1, cell_HP)):
+        if f'monotype {name}' in results:
+            result = results[f'monotype {name}']
+            layout[0].subheader(f"Optimal total cost: :green[**{'€ {:,.2f}'.format(result['cost'])} €**]")
+            layout_left = layout[0].columns(2, gap="large")
+            show_pack(layout_left[column], result[name], cell)
+            show_profiles(result[name], result[name], bool_voltages=False)
+
+    if 'discrete' in results:
+        result = results['discrete']
+        stats = result['stats']
+        show_profiles(result['HE'], result['HP'])
+
+        layout[0].subheader(f"Optimal total cost: :green[**{'€ {:,.2f}'.format(result['cost'])} €**]")
+        if 'checks' in stats:
+            search = f"{stats['checks']} checks of {stats['candidates']} candidates"
         else:
-            df_voltage_2['V_HE'] = V_cell_HE
-            df_voltage_2['V_HP'] = V_cell_HP
-
-        df_voltage_2['V_HE'] *= round(sol.value(SERIES_HE))
-        df_voltage_2['V_HP'] *= round(sol.value(SERIES_HP))
-
-        figure = func.plot_voltages(df_voltage_1)
-        layout_right_primary[0].altair_chart(figure, use_container_width=True)
-        figure = func.plot_voltages(df_voltage_2)
-        layout_right_secondary[0].altair_chart(figure, use_container_width=True)
-
-
-
-
-        #################
-        SERIES_HE = math.ceil(sol.value(SERIES_HE))
-        SERIES_HP = math.ceil(sol.value(SERIES_HP))
-        PARALLEL_HE = sol.value(PARALLEL_HE)
-        PARALLEL_HP = sol.value(PARALLEL_HP)
-
-        TOTALCOST = SERIES_HE * PARALLEL_HE * C_cell_HE + SERIES_HP * PARALLEL_HP * C_cell_HP
-
-        layout[0].subheader(f"Optimal total cost: :green[**{'€ {:,.2f}'.format(TOTALCOST)} €**]")
+            search = f"{stats['nodes']} nodes ({stats['infeasible']} infeasible)"
+        layout[0].write(f"Integer design, {stats['status']}: optimality gap **{stats['gap']:.3%}** "
+                        f"after {search} in {stats['elapsed']:.1f} s")
         layout_left = layout[0].columns(2, gap="large")
+        show_pack(layout_left[0], result['HE'], cell_HE, integer=True)
+        show_pack(layout_left[1], result['HP'], cell_HP, integer=True)
 
-        pack_HE = { 'parameter': ['series', 'parallel', 'total energy', 'nominal voltage', 'maximum current', 'rated current', 'total cost'],
-                    'value': [int(SERIES_HE), int(PARALLEL_HE), f'{round(SERIES_HE*PARALLEL_HE*E_cell_HE, 2)} kWh', f'{round(SERIES_HE * V_cell_HE, 2)} V',
-                    f'{round(max(max(sol.value(I_HE_1)), max(sol.value(I_HE_2))), 2)} A', f'{round(sol.value(PARALLEL_HE) * sol.value(I_cell_HE), 2)} A', f'{round(sol.value(SERIES_HE)*sol.value(PARALLEL_HE)*C_cell_HE, 2)} €']
-        }
-
-        pack_HP = { 'parameter': ['series', 'parallel', 'total energy', 'nominal voltage', 'maximum current', 'rated current', 'total cost'],
-                    'value': [int(SERIES_HP), int(PARALLEL_HP), f'{round(SERIES_HP*PARALLEL_HP*E_cell_HP, 2)} kWh', f'{round(SERIES_HP * V_cell_HP, 2)} V',
-                    f'{round(max(max(sol.value(I_HP_1)), max(sol.value(I_HP_2))), 2)} A', f'{round(sol.value(PARALLEL_HP) * sol.value(I_cell_HP), 2)} A', f'{round(sol.value(SERIES_HP)*sol.value(PARALLEL_HP)*C_cell_HP, 2)} €']
-        }
+    if job.done:
+        show_metrics(job.runs)
 
-        df_pack_HE = pd.DataFrame(pack_HE)
-        df_pack_HP = pd.DataFrame(pack_HP)
-        layout_left[0].table(func.display_pack(df_pack_HE))
-        layout_left[1].table(func.display_pack(df_pack_HP))
-    
+# Once per server process, after the first page is out: default problems prebuilt and solved
+# in the background, so the first click finds them
+@st.cache_resource
+def warm_up():
+    return warmup.start()
 
+warm_up()
@@ -0,0 +1,25 @@
+# NLP construction time versus profile length
+# Run from the repository root: python -m benchmarks.build_time
+import time
+import model
+from benchmarks.common import cell_HE, cell_HP, synthetic_profile
+
+def build(mode, profiles):
+    return model.HBESSProblem(mode, cell_HE, cell_HP, [len(t) for t, _ in profiles], False, False)
+
+def time_build(mode, N, repeat=3):
+    profiles = [synthetic_profile(N, seed=0), synthetic_profile(N, seed=1)]
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build(mode, profiles)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+if __name__ == '__main__':
+    sizes = [1000, 3000, 10000, 30000, 100000]
+    print(f"{'mode':<10}{'N':>8}{'build (s)':>12}{'us/sample':>12}")
+    for mode in ('hybrid', 'HE', 'discrete'):
+        for N in sizes:
+            t = time_build(mode, N)
+            print(f"{mode:<10}{N:>8}{t:>12.4f}{t / N * 1e6:>12.2f}")
@@ -0,0 +1,48 @@
+# Time to first render and to first solve of the app in a fresh interpreter, with and without
+# the warm-up of warmup.py. Each run gets an empty result store, like a new container.
+# Run from the repository root: python -m benchmarks.cold_start [--think 3]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.common import ROOT
+
+def child(think):
+    # Page load, then the user reads the page for think seconds and clicks the solve button
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=600)
+    app.run()
+    render = time.perf_counter() - start
+    time.sleep(think)
+    start = time.perf_counter()
+    app.button[0].click().run()
+    solve = time.perf_counter() - start
+    modules = [name for name in ('casadi', 'scipy', 'altair', 'pandas') if name in sys.modules]
+    print(json.dumps(dict(render=render, solve=solve, modules=modules, failed=bool(app.exception))))
+
+def run(warmup, think):
+    folder = tempfile.mkdtemp()
+    env = dict(os.environ, HBESS_WARMUP=str(int(warmup)), HBESS_STORE=os.path.join(folder, 'results.sqlite'))
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.cold_start', '--child', '--think', str(think)],
+                            cwd=ROOT, env=env, capture_output=True, text=True).stdout
+    total = time.perf_counter() - start
+    return dict(json.loads(output.strip().splitlines()[-1]), total=total)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--think', type=float, default=3.0, help='seconds between first render and the click')
+    parser.add_argument('--child', action='store_true')
+    args = parser.parse_args()
+    if args.child:
+        child(args.think)
+    else:
+        print(f"{'warm-up':<9}{'first render (s)':>18}{'first solve (s)':>17}{'process (s)':>13}  modules loaded")
+        for warmup in (False, True):
+            result = run(warmup, args.think)
+            print(f"{'on' if warmup else 'off':<9}{result['render']:>18.2f}{result['solve']:>17.3f}"
+                  f"{result['total']:>13.2f}  {', '.join(result['modules'])}{'  (failed)' if result['failed'] else ''}")
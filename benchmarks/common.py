@@ -0,0 +1,31 @@
+# Shared fixtures for the benchmarks
+import os
+import numpy        as np
+import pandas       as pd
+import model
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+cell_HE = dict(Q=50, V=3.67, I=50, C=27, E=(50/1000)*3.67,
+               OCV=[3.427, 3.508, 3.588, 3.621, 3.647, 3.684, 3.761, 3.829, 3.917, 4.019, 4.135],
+               OCV_SOC=[0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1])
+cell_HP = dict(Q=23, V=2.3, I=92, C=20, E=(23/1000)*2.3,
+               OCV=[2.067, 2.113, 2.151, 2.183, 2.217, 2.265, 2.326, 2.361, 2.427, 2.516, 2.653],
+               OCV_SOC=[0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1])
+V_pack = 1000
+QUIET = dict(model.SOLVER, verbose=False)
+
+def synthetic_profile(N, dt=1.0, seed=0):
+    # Random-walk duty cycle in W, clipped at zero
+    rng = np.random.default_rng(seed)
+    t = np.arange(N) * dt
+    P = np.clip(np.cumsum(rng.normal(0, 2e4, N)) + 2e5, 0, None)
+    return t, P
+
+def bundled_profiles():
+    # tug_boat_1.csv and tug_boat_2.csv as (t, P) pairs
+    profiles = []
+    for name in ('tug_boat_1.csv', 'tug_boat_2.csv'):
+        df = pd.read_csv(os.path.join(ROOT, name))
+        profiles.append((df['time (s)'].values, df['power (W)'].values))
+    return profiles
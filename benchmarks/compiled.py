@@ -0,0 +1,24 @@
+# Per-iteration IPOPT time, interpreted versus compiled NLP functions
+# Run from the repository root: python -m benchmarks.compiled
+import time
+import model
+from benchmarks.common import cell_HE, cell_HP, V_pack, QUIET, bundled_profiles, synthetic_profile
+
+def run(profiles, compiled):
+    N = [len(t) for t, _ in profiles]
+    start = time.perf_counter()
+    problem = model.HBESSProblem('hybrid', cell_HE, cell_HP, N, False, False, compiled=compiled, solver=QUIET)
+    setup = time.perf_counter() - start
+    stats = problem.solve(cell_HE, cell_HP, profiles, V_pack).stats()
+    nlp = sum(stats[f't_wall_nlp_{f}'] for f in ('f', 'g', 'grad_f', 'jac_g', 'hess_l'))
+    return setup, stats['iter_count'], stats['t_wall_total'], nlp
+
+if __name__ == '__main__':
+    cases = [('bundled', bundled_profiles()),
+             ('synthetic 2x2000', [synthetic_profile(2000, seed=0), synthetic_profile(2000, seed=1)])]
+    print(f"{'profiles':<18}{'build':<12}{'setup (s)':>10}{'iter':>6}{'solve (s)':>11}{'ms/iter':>9}{'nlp eval (s)':>14}")
+    for label, profiles in cases:
+        # compiled twice: the first run compiles, the second reloads from the disk cache
+        for build, compiled in (('interpreted', False), ('compiled', True), ('cached', True)):
+            setup, iters, total, nlp = run(profiles, compiled)
+            print(f"{label:<18}{build:<12}{setup:>10.2f}{iters:>6}{total:>11.3f}{total / iters * 1e3:>9.2f}{nlp:>14.3f}")
@@ -0,0 +1,76 @@
+# Streaming loader and peak/energy-preserving downsampling on long 1 Hz logs
+# Run from the repository root: python -m benchmarks.downsample
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy        as np
+import pandas       as pd
+import loads
+import model
+from benchmarks.common import cell_HE, cell_HP, V_pack, QUIET
+
+def vessel_log(N, seed=0):
+    # 1 Hz shift log: slowly varying base load with short manoeuvring peaks, in W
+    rng = np.random.default_rng(seed)
+    base = np.empty(N)
+    base[0] = 3e5
+    noise = rng.normal(0, 5e3, N)
+    for k in range(1, N):
+        base[k] = base[k-1] + 0.01 * (3e5 - base[k-1]) + noise[k]
+    peaks = np.zeros(N)
+    for start in rng.integers(0, N - 60, N // 1500):
+        peaks[start:start + rng.integers(5, 60)] = rng.uniform(5e5, 1.5e6)
+    return np.arange(N, dtype=float), np.clip(base + peaks, 0, None)
+
+def write_log(N, path):
+    t, P = vessel_log(N)
+    pd.DataFrame({'time (s)': t, 'power (W)': P}).to_csv(path, index=False)
+
+def measure(load):
+    tracemalloc.start()
+    start = time.perf_counter()
+    df = load()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return df, elapsed, peak
+
+def read_full(path):
+    # Previous loader: whole file through pandas, then renamed
+    df_load = pd.read_csv(path)
+    df_load.rename(columns={'time (s)': 't', 'power (W)': 'P'}, inplace=True)
+    return df_load
+
+def solve(df):
+    t, P = df['t'].values, df['P'].values
+    problem = model.HBESSProblem('hybrid', cell_HE, cell_HP, [len(t)], False, False, solver=QUIET)
+    start = time.perf_counter()
+    result = problem.extract(problem.solve(cell_HE, cell_HP, [(t, P)], V_pack))
+    return result['cost'], time.perf_counter() - start
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'log.csv')
+        N = 10**6
+        write_log(N, path)
+        print(f"Loading {N} rows ({os.path.getsize(path) / 1e6:.0f} MB)")
+        print(f"{'loader':<24}{'rows':>9}{'time (s)':>10}{'peak MB':>9}")
+        for name, load in (('read_csv', lambda: read_full(path)),
+                           ('parse_profile', lambda: loads.parse_profile(path)),
+                           ('parse_profile, factor 60', lambda: loads.parse_profile(path, 60))):
+            df, elapsed, peak = measure(load)
+            print(f"{name:<24}{len(df):>9}{elapsed:>10.2f}{peak / 1e6:>9.1f}")
+
+        N = 2 * 10**4
+        write_log(N, path)
+        df_full = loads.parse_profile(path)
+        cost_full, time_full = solve(df_full)
+        print(f"\nHybrid sizing of a {N} s log, full resolution: {cost_full:.2f} in {time_full:.1f} s")
+        print(f"{'factor':>7}{'N':>7}{'solve (s)':>11}{'cost':>13}{'error':>9}{'peak kW':>9}{'energy kWh':>12}")
+        for factor in (1, 5, 10, 30, 60, 300):
+            df = loads.parse_profile(path, factor)
+            cost, elapsed = solve(df) if factor > 1 else (cost_full, time_full)
+            energy = (df['P'].values * model.get_dt(df['t'].values)).sum() / 3.6e6
+            print(f"{factor:>7}{len(df):>7}{elapsed:>11.2f}{cost:>13.2f}{cost / cost_full - 1:>9.3%}"
+                  f"{df['P'].max() / 1e3:>9.0f}{energy:>12.1f}")
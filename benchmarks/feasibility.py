@@ -0,0 +1,38 @@
+# Integer sizing at constant cell voltage: screened enumeration versus NLP branch-and-bound
+# over a small cell catalogue. Run from the repository root: python -m benchmarks.feasibility
+import itertools
+import os
+import time
+import feasibility
+import integer
+import loads
+from benchmarks.common import cell_HE, cell_HP, V_pack, bundled_profiles
+
+# Variants of the reference cells: (capacity Ah, maximum current A, cost €)
+CATALOGUE_HE = [(50, 50, 27), (94, 150, 62), (60, 90, 35), (40, 40, 20)]
+CATALOGUE_HP = [(23, 92, 20), (30, 150, 38), (10, 60, 9)]
+
+def get_cell(cell, Q, I, C):
+    return dict(cell, Q=Q, I=I, C=C, E=(Q/1000) * cell['V'])
+
+if __name__ == '__main__':
+    profiles = [loads.merge(t, P) for t, P in bundled_profiles()]
+    workers = int(os.environ.get('WORKERS', 0)) or None
+    print(f"{'HE (Ah/A/€)':<14}{'HP (Ah/A/€)':<14}{'cost':>10}{'checks':>7}{'enum (s)':>9}{'B&B cost':>10}{'nodes':>6}{'B&B (s)':>9}")
+    total_enum = total_bnb = 0
+    for he, hp in itertools.product(CATALOGUE_HE, CATALOGUE_HP):
+        cells = get_cell(cell_HE, *he), get_cell(cell_HP, *hp)
+        start = time.perf_counter()
+        result = feasibility.solve(*cells, profiles, V_pack, False, workers=workers)
+        elapsed_enum = time.perf_counter() - start
+        start = time.perf_counter()
+        try:
+            result_bnb = integer.solve(*cells, profiles, V_pack, False, True, workers=1, time_limit=120)
+            cost_bnb, nodes = f"{result_bnb['cost']:.0f}", result_bnb['stats']['nodes']
+        except RuntimeError:
+            cost_bnb, nodes = 'failed', '-'
+        elapsed_bnb = time.perf_counter() - start
+        total_enum, total_bnb = total_enum + elapsed_enum, total_bnb + elapsed_bnb
+        print(f"{'/'.join(map(str, he)):<14}{'/'.join(map(str, hp)):<14}{result['cost']:>10.0f}{result['stats']['checks']:>7}"
+              f"{elapsed_enum:>9.3f}{cost_bnb:>10}{nodes:>6}{elapsed_bnb:>9.2f}")
+    print(f"catalogue total: enumeration {total_enum:.2f} s, branch-and-bound {total_bnb:.1f} s")
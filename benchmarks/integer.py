@@ -0,0 +1,19 @@
+# Branch-and-bound integer sizing: nodes, time and optimality gap versus worker processes
+# Run from the repository root: python -m benchmarks.integer
+import os
+import integer
+import loads
+from benchmarks.common import cell_HE, cell_HP, V_pack, bundled_profiles
+
+if __name__ == '__main__':
+    profiles = [loads.merge(t, P) for t, P in bundled_profiles()]
+    workers = sorted({1, 2, 4, 8, 16, os.cpu_count()} & set(range(1, os.cpu_count() + 1)))
+    print(f"Bundled profiles on {os.cpu_count()} cores")
+    print(f"{'workers':>8}{'limit (s)':>10}{'time (s)':>10}{'nodes':>7}{'infeas.':>8}{'cost':>11}{'gap':>9}  design (HE, HP)")
+    for time_limit in (5, 60):
+        for n in workers:
+            result = integer.solve(cell_HE, cell_HP, profiles, V_pack, False, False, time_limit=time_limit, workers=n)
+            stats = result['stats']
+            design = ', '.join(f"{result[name]['SERIES']}s{result[name]['PARALLEL']}p" for name in ('HE', 'HP'))
+            print(f"{n:>8}{time_limit:>10}{stats['elapsed']:>10.1f}{stats['nodes']:>7}{stats['infeasible']:>8}"
+                  f"{result['cost']:>11.0f}{stats['gap']:>9.3%}  {design}")
@@ -0,0 +1,31 @@
+# Merging runs of equal power into variable-length steps: NLP size and solve time per profile
+# Run from the repository root: python -m benchmarks.merge
+import time
+import loads
+import model
+from benchmarks.common import cell_HE, cell_HP, V_pack, QUIET
+
+def solve(mode, profiles, repeat=5):
+    problem = model.HBESSProblem(mode, cell_HE, cell_HP, [len(t) for t, _ in profiles], False, False, solver=QUIET)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = problem.extract(problem.solve(cell_HE, cell_HP, profiles, V_pack))
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+if __name__ == '__main__':
+    profiles = {path: loads.read_profile(path) for _, path in loads.PROFILES}
+    cases = [(path, [(df['t'].values, df['P'].values)]) for path, df in profiles.items()]
+    cases.append(('both', [profile for _, (profile,) in cases]))
+    print(f"{'profile':<16}{'mode':<8}{'samples':>13}{'variables':>13}{'solve (ms)':>15}{'speedup':>9}{'cost':>14}")
+    for name, raw in cases:
+        merged = [loads.merge(t, P) for t, P in raw]
+        for mode in ('hybrid', 'HE', 'HP'):
+            result_raw, time_raw = solve(mode, raw)
+            result, elapsed = solve(mode, merged)
+            assert abs(result['cost'] - result_raw['cost']) <= 1e-6 * result_raw['cost'], (result['cost'], result_raw['cost'])
+            samples = f"{sum(len(t) for t, _ in raw)}->{sum(len(t) for t, _ in merged)}"
+            variables = f"{result_raw['dimensions']['variables']}->{result['dimensions']['variables']}"
+            print(f"{name:<16}{mode:<8}{samples:>13}{variables:>13}{time_raw * 1e3:>7.0f}->{elapsed * 1e3:<7.0f}"
+                  f"{time_raw / elapsed:>9.2f}{result['cost']:>14.2f}")
@@ -0,0 +1,30 @@
+# Continuous sizing at constant cell voltage: NLP (IPOPT) versus the exact linear fast path,
+# on repeated duty cycles. Run from the repository root: python -m benchmarks.relaxation
+import time
+import numpy        as np
+import feasibility
+import model
+from benchmarks.common import cell_HE, cell_HP, V_pack, QUIET, bundled_profiles
+
+MAX_NLP = 10000         # longest profile also solved as an NLP
+
+def get_cycles(repeats):
+    # Second bundled profile repeated back to back, on its mean time step
+    t, P = bundled_profiles()[1]
+    return np.arange(len(P) * repeats) * np.diff(t).mean(), np.tile(P, repeats)
+
+if __name__ == '__main__':
+    print(f"{'N':>7}{'fast cost':>14}{'fast (s)':>10}{'checks':>8}{'NLP cost':>14}{'NLP (s)':>9}{'iters':>7}")
+    for repeats in (1, 8, 40, 200, 1000):
+        profiles = [get_cycles(repeats)]
+        N = len(profiles[0][1])
+        start = time.perf_counter()
+        result = feasibility.solve_relaxation(cell_HE, cell_HP, profiles, V_pack, False)
+        fast = time.perf_counter() - start
+        line = f"{N:>7}{result['cost']:>14.2f}{fast:>10.3f}{result['stats']['iter_count']:>8}"
+        if N <= MAX_NLP:
+            start = time.perf_counter()
+            problem = model.HBESSProblem('hybrid', cell_HE, cell_HP, [N], False, True, solver=QUIET)
+            result_nlp = problem.extract(problem.solve(cell_HE, cell_HP, profiles, V_pack))
+            line += f"{result_nlp['cost']:>14.2f}{time.perf_counter() - start:>9.2f}{result_nlp['stats']['iter_count']:>7}"
+        print(line, flush=True)
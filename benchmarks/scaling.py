@@ -0,0 +1,165 @@
+# Time and peak memory of every phase (CSV load, NLP build, solve, extraction, charts) versus
+# profile length, per mode, written as JSON so runs on different versions can be compared.
+# Run from the repository root:
+#   python -m benchmarks.scaling [--sizes 100 1000 ...] [--modes hybrid HE discrete] [--output scaling.json]
+#   python -m benchmarks.scaling --compare old.json new.json
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import altair       as alt
+import casadi       as ca
+import numpy        as np
+import pandas       as pd
+import func
+import integer
+import loads
+import model
+from benchmarks.common import ROOT, cell_HE, cell_HP, V_pack, QUIET, synthetic_profile
+
+SIZES = [100, 300, 1000, 3000, 10000, 30000, 100000]
+MODES = ['hybrid', 'HE', 'HP', 'discrete']
+BUDGET = 300            # s; a mode stops growing after a case that takes longer
+TIME_LIMIT = 120        # s, branch-and-bound limit of the discrete cases
+THRESHOLD = 1.2         # ratio above which --compare flags a phase as a regression
+
+def get_rss():
+    # Peak resident memory of this process so far, in MB (ru_maxrss is in kB on Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def timed(phases, name, function, *args, **kwargs):
+    # Record wall time and peak memory after one phase
+    start = time.perf_counter()
+    value = function(*args, **kwargs)
+    phases[name] = dict(time=time.perf_counter() - start, peak_rss=get_rss())
+    return value
+
+def plot(profiles, result, names):
+    # The chart builders of the app for one solved case, serialised the way the browser receives them
+    alt.data_transformers.disable_max_rows()
+    pack_HE, pack_HP = (result[names[0]], result[names[-1]])
+    charts = []
+    for k, (t, P) in enumerate(profiles):
+        t_SOC = model.get_t_SOC(t)
+        charts.append(func.plot_powers(pd.DataFrame(dict(t=t, P=P, P_HE=pack_HE['P'][k], P_HP=pack_HP['P'][k]))))
+        df_SOC = pd.DataFrame(dict(t=t_SOC, SOC_HE=pack_HE['SOC'][k], SOC_HP=pack_HP['SOC'][k]))
+        charts.append(func.plot_SOC(df_SOC))
+        charts.append(func.plot_currents(pd.DataFrame(dict(t=t, I_HE=pack_HE['I'][k], I_HP=pack_HP['I'][k]))))
+        V = {name: np.interp(df_SOC[f'SOC_{name}'], cell['OCV_SOC'], cell['OCV']) * round(pack['SERIES'])
+             for name, cell, pack in (('HE', cell_HE, pack_HE), ('HP', cell_HP, pack_HP))}
+        charts.append(func.plot_voltages(pd.DataFrame(dict(t=t_SOC, V_HE=V['HE'], V_HP=V['HP']))))
+    return [chart.to_dict() for chart in charts]
+
+def run_case(mode, N):
+    # One mode and profile length, in a fresh process so the peak memory is its own
+    phases = {}
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'profile.csv')
+        t, P = synthetic_profile(N)
+        pd.DataFrame({'time (s)': t, 'power (W)': P}).to_csv(path, index=False)
+        df = timed(phases, 'csv', loads.parse_profile, path)
+    profiles = [(df['t'].values, df['P'].values)]
+    case = dict(mode=mode, N=N, baseline_rss=get_rss())
+    if mode == 'discrete':
+        # Node problem build on its own; the search then builds its own copy and solves in this process
+        timed(phases, 'build', model.HBESSProblem, 'discrete', cell_HE, cell_HP, [N], False, False, solver=QUIET)
+        result = timed(phases, 'solve', integer.solve, cell_HE, cell_HP, profiles, V_pack, False, False,
+                       time_limit=TIME_LIMIT, workers=1, solver=QUIET)
+        names = ('HE', 'HP')
+        case.update(iterations=result['stats']['nodes'], status=result['stats']['status'])
+    else:
+        problem = timed(phases, 'build', model.HBESSProblem, mode, cell_HE, cell_HP, [N], False, False, solver=QUIET)
+        sol = timed(phases, 'solve', problem.solve, cell_HE, cell_HP, profiles, V_pack)
+        result = timed(phases, 'extract', problem.extract, sol)
+        names = problem.names
+        case.update(iterations=result['stats']['iter_count'], status=result['stats']['return_status'],
+                    solver_time=result['stats']['t_wall_total'])
+    timed(phases, 'plot', plot, profiles, result, names)
+    case.update(cost=result['cost'], dimensions=result['dimensions'], phases=phases,
+                total=sum(phase['time'] for phase in phases.values()), peak_rss=get_rss())
+    return case
+
+def run_isolated(mode, N):
+    # spawn: a clean interpreter per case, one BLAS thread like the solver pools
+    os.environ.setdefault('OMP_NUM_THREADS', '1')
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        try:
+            return pool.submit(run_case, mode, N).result()
+        except Exception as error:
+            return dict(mode=mode, N=N, status=f'{type(error).__name__}: {error}'.splitlines()[0])
+
+def get_environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return dict(commit=commit or None, date=time.strftime('%Y-%m-%dT%H:%M:%S'), python=platform.python_version(),
+                casadi=ca.__version__, numpy=np.__version__, pandas=pd.__version__, altair=alt.__version__,
+                machine=platform.platform(), cpus=os.cpu_count(), solver=model.get_label(QUIET))
+
+def show(case):
+    if 'phases' not in case:
+        print(f"{case['mode']:<10}{case['N']:>8}  {case['status']}", flush=True)
+        return
+    times = ''.join(f"{case['phases'].get(phase, {}).get('time', float('nan')):>9.3f}"
+                    for phase in ('csv', 'build', 'solve', 'extract', 'plot'))
+    print(f"{case['mode']:<10}{case['N']:>8}{times}{case['iterations']:>7}{case['peak_rss']:>9.0f}  {case['status']}",
+          flush=True)
+
+def benchmark(sizes, modes, budget):
+    cases = []
+    print(f"{'mode':<10}{'N':>8}{'csv':>9}{'build':>9}{'solve':>9}{'extract':>9}{'plot':>9}{'iters':>7}{'MB':>9}")
+    for mode in modes:
+        for N in sizes:
+            case = run_isolated(mode, N)
+            cases.append(case)
+            show(case)
+            if 'phases' not in case or case['total'] > budget:
+                break
+    return cases
+
+def compare(old_path, new_path, threshold=THRESHOLD):
+    # Per-phase time ratio new/old for the cases both runs have, slower ones flagged
+    with open(old_path) as file:
+        old = json.load(file)
+    with open(new_path) as file:
+        new = json.load(file)
+    print(f"old: {old['environment']['commit']}  new: {new['environment']['commit']}")
+    before = {(case['mode'], case['N']): case for case in old['cases'] if 'phases' in case}
+    print(f"{'mode':<10}{'N':>8}{'phase':>9}{'old (s)':>10}{'new (s)':>10}{'ratio':>8}")
+    regressions = 0
+    for case in new['cases']:
+        reference = before.get((case['mode'], case['N']))
+        if reference is None or 'phases' not in case:
+            continue
+        for phase, values in case['phases'].items():
+            if phase not in reference['phases']:
+                continue
+            ratio = values['time'] / max(reference['phases'][phase]['time'], 1e-9)
+            flag = '  slower' if ratio > threshold else ''
+            regressions += bool(flag)
+            print(f"{case['mode']:<10}{case['N']:>8}{phase:>9}{reference['phases'][phase]['time']:>10.3f}"
+                  f"{values['time']:>10.3f}{ratio:>8.2f}{flag}")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--budget', type=float, default=BUDGET)
+    parser.add_argument('--output', default='scaling.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+    if args.compare:
+        raise SystemExit(1 if compare(*args.compare) else 0)
+    environment = get_environment()
+    cases = benchmark(args.sizes, args.modes, args.budget)
+    with open(args.output, 'w') as file:
+        json.dump(dict(environment=environment, cases=cases), file, indent=1, default=str)
+    print(f"written to {args.output}")
@@ -0,0 +1,28 @@
+# NLP construction and solve time versus number of duty cycles sharing one sizing
+# Run from the repository root: python -m benchmarks.scenarios
+import time
+import model
+from benchmarks.common import cell_HE, cell_HP, V_pack, QUIET, synthetic_profile
+
+def time_scenarios(K, N):
+    profiles = [synthetic_profile(N, seed=k) for k in range(K)]
+    start = time.perf_counter()
+    problem = model.HBESSProblem('hybrid', cell_HE, cell_HP, [N] * K, False, False, solver=QUIET)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    try:
+        stats = problem.solve(cell_HE, cell_HP, profiles, V_pack).stats()
+        status = stats['return_status']
+    except RuntimeError:
+        stats = problem.opti.stats()
+        status = 'failed'
+    return build, time.perf_counter() - start, stats['iter_count'], status, problem.dimensions()
+
+if __name__ == '__main__':
+    N = 200
+    print(f"{N} samples per duty cycle")
+    print(f"{'cycles':>7}{'variables':>11}{'build (s)':>11}{'solve (s)':>11}{'iters':>7}{'ms/iter':>9}  status")
+    for K in (1, 2, 5, 10, 20, 50, 100):
+        build, solve, iterations, status, dimensions = time_scenarios(K, N)
+        print(f"{K:>7}{dimensions['variables']:>11}{build:>11.3f}{solve:>11.2f}{iterations:>7}"
+              f"{solve / max(iterations, 1) * 1e3:>9.1f}  {status}")
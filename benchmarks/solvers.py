@@ -0,0 +1,37 @@
+# Hybrid sizing of the bundled profiles with every solver configuration, labelled for comparison.
+# Run from the repository root: python -m benchmarks.solvers [--all]
+# --all adds the other CasADi backends; sqpmethod spends minutes in its dense QP on this problem
+import sys
+import time
+import model
+from benchmarks.common import cell_HE, cell_HP, V_pack, QUIET, bundled_profiles
+
+MAX_ITER = 300          # iteration limit of the trial runs, enough for the configurations that converge
+
+def get_configurations():
+    # Default IPOPT settings with printing on and off, then one change at a time
+    yield dict(QUIET, verbose=True)
+    yield QUIET
+    for linear_solver in model.get_linear_solvers()[1:]:
+        yield dict(QUIET, linear_solver=linear_solver)
+    yield dict(QUIET, hessian='limited-memory', max_iter=MAX_ITER)
+    yield dict(QUIET, tol=1e-6)
+    for backend in model.BACKENDS[1:] if '--all' in sys.argv else ():
+        yield dict(QUIET, backend=backend, max_iter=MAX_ITER)
+
+if __name__ == '__main__':
+    profiles = bundled_profiles()
+    N = [len(P) for _, P in profiles]
+    results = []
+    for solver in get_configurations():
+        start = time.perf_counter()
+        problem = model.HBESSProblem('hybrid', cell_HE, cell_HP, N, False, False, solver=solver)
+        try:
+            stats = problem.extract(problem.solve(cell_HE, cell_HP, profiles, V_pack))['stats']
+            status, iterations = stats['return_status'], stats['iter_count']
+        except RuntimeError:
+            status, iterations = problem.opti.stats().get('return_status', 'failed'), problem.opti.stats().get('iter_count')
+        results.append((problem.label, status, iterations, time.perf_counter() - start))
+    print(f"{'solver':<60}{'status':<28}{'iters':>7}{'time (s)':>10}")
+    for label, status, iterations, elapsed in results:
+        print(f"{label:<60}{status:<28}{iterations if iterations is not None else '':>7}{elapsed:>10.2f}")
@@ -0,0 +1,26 @@
+# Voltage sweep throughput versus number of worker processes
+# Run from the repository root: python -m benchmarks.sweep
+import os
+import tempfile
+import time
+import numpy        as np
+
+os.environ['HBESS_STORE'] = os.path.join(tempfile.mkdtemp(), 'results.sqlite')   # never hit stored points
+import sweep
+from benchmarks.common import cell_HE, cell_HP, QUIET, bundled_profiles
+
+if __name__ == '__main__':
+    profiles = bundled_profiles()
+    voltages = np.arange(400, 1600 + 1, 25)
+    workers = sorted({1, 2, 4, 8, 16, 32, os.cpu_count()} & set(range(1, os.cpu_count() + 1)))
+    print(f"{len(voltages)} voltages on {os.cpu_count()} cores")
+    print(f"{'workers':>8}{'wall (s)':>10}{'points/s':>10}{'speedup':>9}{'min cost':>14}{'at V':>7}")
+    base = None
+    for n in workers:
+        voltages = voltages + 1e-3      # distinct keys per run, so the store is never hit
+        start = time.perf_counter()
+        df = sweep.sweep(cell_HE, cell_HP, profiles, voltages, False, False, workers=n, solver=QUIET)
+        wall = time.perf_counter() - start
+        base = base or wall
+        best = df.loc[df['cost'].idxmin()]
+        print(f"{n:>8}{wall:>10.2f}{len(voltages) / wall:>10.2f}{base / wall:>9.2f}{best['cost']:>14.2f}{best['V_pack']:>7.0f}")
@@ -0,0 +1,36 @@
+# IPOPT iterations of cold versus warm-started re-solves after small input changes
+# Run from the repository root: python -m benchmarks.warm_start
+import model
+from benchmarks.common import cell_HE, cell_HP, V_pack, QUIET, bundled_profiles
+
+def nudges():
+    # (label, cell_HE, cell_HP, V_pack), applied one after another like UI tweaks
+    yield 'baseline', cell_HE, cell_HP, V_pack
+    yield 'Q_cell_HE 50 -> 52', dict(cell_HE, Q=52, E=(52/1000)*cell_HE['V']), cell_HP, V_pack
+    yield 'C_cell_HE 27 -> 29', dict(cell_HE, C=29), cell_HP, V_pack
+    yield 'I_cell_HE 50 -> 55', dict(cell_HE, I=55), cell_HP, V_pack
+    yield 'I_cell_HP 92 -> 90', cell_HE, dict(cell_HP, I=90), V_pack
+    yield 'Q_cell_HP 23 -> 24', cell_HE, dict(cell_HP, Q=24, E=(24/1000)*cell_HP['V']), V_pack
+    yield 'V_pack 1000 -> 1050', cell_HE, cell_HP, 1050
+
+if __name__ == '__main__':
+    profiles = bundled_profiles()
+    N = [len(t) for t, _ in profiles]
+    warm = model.HBESSProblem('hybrid', cell_HE, cell_HP, N, False, False, solver=QUIET)
+    total = dict(cold=0, warm=0)
+    print(f"{'change':<22}{'cold iter':>10}{'warm iter':>10}{'cold cost':>14}{'warm cost':>14}")
+    for label, HE, HP, V in nudges():
+        cold = model.HBESSProblem('hybrid', HE, HP, N, False, False, solver=QUIET)
+        try:
+            sol_cold = cold.solve(HE, HP, profiles, V)
+            iter_cold, cost_cold = sol_cold.stats()['iter_count'], f'{sol_cold.value(cold.objective):.2f}'
+        except RuntimeError:
+            iter_cold, cost_cold = cold.opti.stats()['iter_count'], 'failed'
+        sol_warm = warm.solve(HE, HP, profiles, V, warm_start=True)
+        iter_warm = sol_warm.stats()['iter_count']
+        if label != 'baseline':
+            total['cold'] += iter_cold
+            total['warm'] += iter_warm
+        print(f"{label:<22}{iter_cold:>10}{iter_warm:>10}{cost_cold:>14}{sol_warm.value(warm.objective):>14.2f}")
+    print(f"re-solve iterations: cold {total['cold']}, warm {total['warm']} "
+          f"({100 * (1 - total['warm'] / total['cold']):.0f}% fewer)")
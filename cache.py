@@ -0,0 +1,87 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import numpy        as np
+import pandas       as pd
+
+class LRUCache:
+    # Thread-safe mapping holding at most maxsize entries, least recently used evicted first
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.data:
+                return default
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def get_or_create(self, key, create):
+        # create() runs outside the lock; concurrent misses may both create, the last one wins
+        value = self.get(key)
+        if value is None:
+            value = create()
+            self.put(key, value)
+        return value
+
+    def pop(self, key, default=None):
+        with self.lock:
+            return self.data.pop(key, default)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.data
+
+    def __len__(self):
+        with self.lock:
+            return len(self.data)
+
+def update_hash(h, obj):
+    # Canonical, type-tagged serialisation of nested inputs
+    if isinstance(obj, pd.DataFrame):
+        h.update(b'df')
+        update_hash(h, [(str(column), obj[column].to_numpy()) for column in obj.columns])
+    elif isinstance(obj, np.ndarray):
+        h.update(b'nd' + str(obj.dtype).encode() + str(obj.shape).encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        h.update(b'd%d' % len(obj))
+        for key in sorted(obj, key=repr):
+            update_hash(h, key)
+            update_hash(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update(b'l%d' % len(obj))
+        for item in obj:
+            update_hash(h, item)
+    else:
+        h.update(type(obj).__name__.encode() + repr(obj).encode())
+    h.update(b';')
+
+def get_hash(*inputs):
+    h = hashlib.sha256()
+    update_hash(h, inputs)
+    return h.hexdigest()
+
+# Process-level caches, shared by all sessions of the app
+profiles = LRUCache(int(os.environ.get('HBESS_PROFILE_CACHE_SIZE', 16)))
+charts = LRUCache(int(os.environ.get('HBESS_CHART_CACHE_SIZE', 64)))
+results = LRUCache(int(os.environ.get('HBESS_RESULT_CACHE_SIZE', 32)))
+# Built problems hold solver state, they are cached per session with this bound
+PROBLEM_CACHE_SIZE = int(os.environ.get('HBESS_PROBLEM_CACHE_SIZE', 4))
+# Problems prebuilt by warmup.py, each taken over by the first session that needs its structure
+templates = LRUCache(int(os.environ.get('HBESS_TEMPLATE_CACHE_SIZE', 8)))
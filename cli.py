@@ -0,0 +1,111 @@
+# Sizing from the command line, without the Streamlit runtime:
+#   python cli.py tug_boat_1.csv tug_boat_2.csv --mode hybrid --V-pack 1000 --Q-HE 50 --output results
+# Batch: every line of --cases is a JSON object overriding options of the command line, e.g.
+#   {"V_pack": 800, "Q_HE": 60, "mode": "discrete"}
+# The summary of every case is printed as one JSON line and, with --output, written there too
+# together with the time series of every profile.
+import argparse
+import json
+import os
+import sys
+import cache
+import integer
+import metrics
+import model
+import sizing
+
+FIELDS = ('Q', 'I', 'C')       # cell parameters settable per chemistry
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Hybrid battery sizing without the web app')
+    parser.add_argument('profiles', nargs='+', help='CSV files with columns "time (s)" and "power (W)"')
+    parser.add_argument('--mode', choices=model.MODES, default='hybrid')
+    parser.add_argument('--V-pack', dest='V_pack', type=float, default=sizing.V_PACK, help='nominal pack voltage (V)')
+    for name, cell in (('HE', sizing.CELL_HE), ('HP', sizing.CELL_HP)):
+        for field, unit in zip(FIELDS, ('Ah', 'A', '€')):
+            parser.add_argument(f'--{field}-{name}', dest=f'{field}_{name}', type=float, default=cell[field],
+                                help=f'{name} cell {dict(Q="capacity", I="maximum current", C="cost")[field]} ({unit})')
+    parser.add_argument('--neg', dest='bool_neg', action='store_true', help='allow packs to charge each other')
+    parser.add_argument('--OCV', dest='bool_OCV', action='store_true', help='constant cell voltage')
+    parser.add_argument('--factor', type=int, default=1, help='downsampling factor of the profiles')
+    parser.add_argument('--no-merge', dest='bool_merge', action='store_false',
+                        help='keep runs of equal power as separate samples')
+    parser.add_argument('--time-limit', dest='time_limit', type=float, default=integer.TIME_LIMIT,
+                        help='integer search time limit (s)')
+    parser.add_argument('--backend', choices=model.BACKENDS, default=model.SOLVER['backend'])
+    parser.add_argument('--linear-solver', dest='linear_solver', default=model.SOLVER['linear_solver'])
+    parser.add_argument('--hessian', choices=model.HESSIANS, default=model.SOLVER['hessian'])
+    parser.add_argument('--tol', type=float, default=model.SOLVER['tol'])
+    parser.add_argument('--max-iter', dest='max_iter', type=int, default=model.SOLVER['max_iter'])
+    parser.add_argument('--verbose', action='store_true', help='solver log on the console')
+    parser.add_argument('--compiled', action='store_true', help='solve with code-generated NLP functions')
+    parser.add_argument('--no-store', dest='bool_store', action='store_false', help='do not read or write the result store')
+    parser.add_argument('--cases', help='JSON lines file, one case per line')
+    parser.add_argument('--output', help='folder for the summaries and time series')
+    parser.add_argument('--metrics', help='file for the solver statistics in the Prometheus text format')
+    return parser
+
+def get_solver(options):
+    return {key: options[key] for key in model.SOLVER}
+
+def run_case(options, profiles, problems):
+    # Result of one case; options: parsed arguments with the overrides of the case applied
+    cells = {name: sizing.get_cell(cell, **{field: options[f'{field}_{name}'] for field in FIELDS})
+             for name, cell in (('HE', sizing.CELL_HE), ('HP', sizing.CELL_HP))}
+    case = sizing.Sizing(cells['HE'], cells['HP'], profiles, options['V_pack'], options['bool_neg'], options['bool_OCV'],
+                         solver=get_solver(options), compiled=options['compiled'], problems=problems,
+                         bool_store=options['bool_store'])
+    if options['mode'] == 'discrete':
+        return case.solve_integer(options['time_limit'])
+    return case.solve(options['mode'])
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    defaults = vars(args)
+    cases = [{}]
+    if args.cases:
+        with open(args.cases) as file:
+            cases = [json.loads(line) for line in file if line.strip()]
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        open(os.path.join(args.output, 'summary.jsonl'), 'w').close()
+    scenarios = {}      # per (factor, merge), shared by the cases
+    problems = cache.LRUCache(cache.PROBLEM_CACHE_SIZE)   # built problems, reused by cases of the same structure
+    runs = {}
+    failed = 0
+    for k, overrides in enumerate(cases):
+        unknown = set(overrides) - set(defaults)
+        if unknown:
+            raise SystemExit(f"case {k}: unknown options {', '.join(sorted(unknown))}")
+        options = dict(defaults, **overrides)
+        key = (tuple(options['profiles']), options['factor'], options['bool_merge'])
+        if key not in scenarios:
+            scenarios[key] = sizing.read_profiles(*key)
+        profiles = [(scenario['t'], scenario['P']) for scenario in scenarios[key]]
+        name = f'case {k}' if args.cases else options['mode']
+        try:
+            result = run_case(options, profiles, problems)
+        except RuntimeError as error:
+            failed += 1
+            runs[name] = dict(stats=dict(return_status='failed', success=False,
+                                         solver=model.get_label(get_solver(options))))
+            summary = dict(case=k, **overrides, status='failed', error=str(error).splitlines()[-1])
+        else:
+            runs[name] = result
+            values = metrics.get_metrics(result)
+            summary = dict(case=k, **overrides, **sizing.get_summary(result), status=values['status'],
+                           iterations=values['iterations'], time=values['time'])
+        print(json.dumps(summary), flush=True)
+        if not args.output:
+            continue
+        with open(os.path.join(args.output, 'summary.jsonl'), 'a') as file:
+            file.write(json.dumps(summary) + '\n')
+        if 'cost' in runs[name]:
+            for scenario, df in zip(scenarios[key], sizing.get_series(result, profiles)):
+                stem = os.path.splitext(os.path.basename(scenario['name']))[0]
+                df.to_csv(os.path.join(args.output, f'case_{k}_{stem}.csv'), index=False)
+    metrics.export(runs, args.metrics)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
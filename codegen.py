@@ -0,0 +1,67 @@
+import hashlib
+import os
+import subprocess
+import tempfile
+import casadi       as ca
+
+# Compiled NLP functions are cached per problem structure and CasADi version
+CACHE_DIR = os.environ.get('HBESS_CODEGEN_DIR',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), '.hbess_cache', 'codegen'))
+CC = os.environ.get('CC', 'gcc')
+CFLAGS = ['-fPIC', '-shared', '-O1']
+
+def get_name(structure, backend='ipopt'):
+    return 'hbess_' + hashlib.sha1(repr((structure, backend, ca.__version__)).encode()).hexdigest()[:16]
+
+def get_library(opti, structure, backend='ipopt'):
+    # Path of the shared library holding the NLP functions the backend calls, compiled on first use
+    name = get_name(structure, backend)
+    path = os.path.join(CACHE_DIR, name + '.so')
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    solver = ca.nlpsol('nlp', backend, dict(x=opti.x, p=opti.p, f=opti.f, g=opti.g))
+    with tempfile.TemporaryDirectory(dir=CACHE_DIR) as tmp:
+        generator = ca.CodeGenerator(name + '.c')
+        generator.add(solver.oracle())
+        for function in solver.get_function():
+            generator.add(solver.get_function(function))
+        c_file = generator.generate(tmp + os.sep)
+        so_file = os.path.join(tmp, name + '.so')
+        subprocess.run([CC, *CFLAGS, c_file, '-o', so_file], check=True)
+        os.replace(so_file, path)    # atomic, concurrent builders of the same structure are harmless
+    return path
+
+def get_solver(opti, structure, backend, options):
+    return ca.nlpsol(get_name(structure, backend), backend, get_library(opti, structure, backend), options)
+
+class Solution:
+    # OptiSol look-alike for solves that bypass opti.solve()
+
+    def __init__(self, opti, x, p, lam_g, stats):
+        self.opti = opti
+        self.x = x
+        self.p = p
+        self.lam_g = lam_g
+        self._stats = stats
+
+    def value(self, expr):
+        if not isinstance(expr, ca.MX):
+            return expr
+        opti = self.opti
+        value = ca.Function('value', [opti.x, opti.p, opti.lam_g], [expr])(self.x, self.p, self.lam_g)
+        return float(value) if value.is_scalar() else value.full().ravel()
+
+    def stats(self):
+        return self._stats
+
+def solve(opti, solver):
+    # Solve with the current parameter values and initial guess of opti
+    p = opti.value(opti.p)
+    result = solver(x0=opti.value(opti.x, opti.initial()), lam_g0=opti.value(opti.lam_g, opti.initial()), p=p,
+                    lbg=opti.value(opti.lbg), ubg=opti.value(opti.ubg))
+    stats = solver.stats()
+    if not stats['success']:
+        raise RuntimeError(f"Solver failed: {stats['return_status']}")
+    return Solution(opti, result['x'], p, result['lam_g'], stats)
@@ -0,0 +1,325 @@
+import heapq
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy        as np
+import model
+
+# Sizing at constant cell voltage (bool_OCV). With the series counts set by the pack voltage,
+# the current limits become power limits and SOC is linear in the pack power, so for given
+# parallel counts the energy the HE pack has delivered since the start must stay in a window
+# at every sample and change by a bounded step every time step. The reachable energies then
+# form one interval per sample, found for a whole profile in a few vectorized passes: an exact
+# feasibility check of the power split, with no LP to solve. The violation of that check is
+# convex and piecewise linear in the parallel counts, which gives the continuous optimum by
+# Newton steps and cutting planes (solve_relaxation). Integer designs are walked in order of
+# increasing cost and the first feasible one is optimal (solve).
+
+BATCH = 32              # candidates per worker and round
+MAX_CANDIDATES = 10**6
+MAX_ITER = 200          # Newton steps and cutting planes of solve_relaxation
+TOLERANCE = 1e-9        # violation, as a share of the profile energy throughput, still feasible
+LABEL = 'exact, constant OCV'   # solver label of the results
+
+# SOC headroom above and below the initial state
+CHARGE = model.SOC_MAX - model.SOC_INIT
+DISCHARGE = model.SOC_INIT - model.SOC_MIN
+
+# Profiles and cells of this process, set by init_worker
+_worker = {}
+
+def get_series(cell, V_pack):
+    # Same rounding as the model's pack voltage constraint
+    return math.floor(V_pack / cell['V'] + 0.5)
+
+def get_strings(cell_HE, cell_HP, SERIES):
+    # Energy [J] and power limit [W] of one parallel string of each pack
+    cells = dict(HE=cell_HE, HP=cell_HP)
+    E = {name: SERIES[name] * cell['E'] * 3.6e6 for name, cell in cells.items()}
+    P_max = {name: SERIES[name] * cell['V'] * cell['I'] for name, cell in cells.items()}
+    return E, P_max
+
+def get_cycles(profiles):
+    # Per profile: time steps, power, delivered energy at every sample [J] and energy throughput [J]
+    cycles = []
+    for t, P in profiles:
+        dt = model.get_dt(t)
+        cycles.append((dt, P, np.r_[0, np.cumsum(P * dt)], max(np.sum(np.abs(P) * dt), 1.0)))
+    return cycles
+
+def get_requirements(profiles):
+    # Per profile: peak power [W], largest net discharge and charge from the start [J]
+    return [(np.max(P), max(np.max(D), 0), max(-np.min(D), 0)) for _, P, D, _ in get_cycles(profiles)]
+
+def init_worker(cell_HE, cell_HP, profiles, SERIES, bool_neg):
+    _worker.clear()
+    E, P_max = get_strings(cell_HE, cell_HP, SERIES)
+    _worker.update(cycles=get_cycles(profiles), E=E, P_max=P_max, bool_neg=bool_neg)
+
+def get_limits(PARALLEL):
+    # Energy [J] and power limit [W] of each pack for the given parallel counts
+    return ({name: PARALLEL[name] * E for name, E in _worker['E'].items()},
+            {name: PARALLEL[name] * P_max for name, P_max in _worker['P_max'].items()})
+
+def get_bounds(cycle, PARALLEL, E, P_max, bool_neg):
+    # Range [l, u] of the HE power at every step and window [w_lo, w_hi] of the energy it has
+    # delivered at every sample, from the power limits and SOC windows of both packs
+    dt, P, D, _ = cycle
+    l = np.maximum(P - PARALLEL['HP'] * P_max['HP'], 0 if not bool_neg else -np.inf)
+    u = np.full(len(P), PARALLEL['HE'] * P_max['HE'])
+    if not bool_neg:
+        u = np.minimum(u, P)
+    w_lo = np.maximum(-CHARGE * PARALLEL['HE'] * E['HE'], D - DISCHARGE * PARALLEL['HP'] * E['HP'])
+    w_hi = np.minimum(DISCHARGE * PARALLEL['HE'] * E['HE'], D + CHARGE * PARALLEL['HP'] * E['HP'])
+    w_lo[0] = w_hi[0] = 0
+    return l, u, w_lo, w_hi
+
+def get_reachable(dt, l, u, w_lo, w_hi):
+    # Reachable delivered energies [lo, hi] at every sample:
+    #   lo[k+1] = max(lo[k] + l[k]*dt[k], w_lo[k+1]), hi[k+1] = min(hi[k] + u[k]*dt[k], w_hi[k+1])
+    # as running extrema; L and U are the cumulated step bounds
+    L, U = np.r_[0, np.cumsum(l * dt)], np.r_[0, np.cumsum(u * dt)]
+    return L + np.maximum.accumulate(w_lo - L), U + np.minimum.accumulate(w_hi - U), L, U
+
+def get_violation(cycles, PARALLEL, E, P_max, bool_neg):
+    # Largest violation of the split over all profiles, as a share of the profile throughput
+    # (feasible when <= TOLERANCE), and its gradient [d/dPARALLEL_HE, d/dPARALLEL_HP]. The
+    # violation is a maximum of affine functions of the parallel counts; the gradient is the
+    # one of the active piece, read off the arg max of every running extremum.
+    a, b = PARALLEL['HE'], PARALLEL['HP']
+    violation, gradient = -np.inf, np.zeros(2)
+    for cycle in cycles:
+        dt, P, D, scale = cycle
+        l, u, w_lo, w_hi = get_bounds(cycle, PARALLEL, E, P_max, bool_neg)
+        lo, hi, L, U = get_reachable(dt, l, u, w_lo, w_hi)
+        # Sensitivity of the step bounds to PARALLEL_HP (l) and PARALLEL_HE (u)
+        dl = -P_max['HP'] * dt * ((P - b * P_max['HP'] > 0) | bool_neg)
+        du = P_max['HE'] * dt * ((a * P_max['HE'] < P) | bool_neg)
+        gap, step = lo - hi, (l - u) * dt
+        gap[0] = -np.inf        # both windows pin the start at zero
+        k, m = np.argmax(gap), np.argmax(step)
+        if max(gap[k], step[m]) / scale <= violation:
+            continue
+        if step[m] > gap[k]:
+            violation, gradient = step[m] / scale, np.array([-du[m], dl[m]]) / scale
+            continue
+        # lo[k] = w_lo[j] + L[k] - L[j], hi[k] = w_hi[i] + U[k] - U[i]
+        j, i = np.argmax((w_lo - L)[:k + 1]), np.argmin((w_hi - U)[:k + 1])
+        gradient = np.array([-np.sum(du[i:k]), np.sum(dl[j:k])])
+        if j > 0:
+            gradient += [-CHARGE * E['HE'], 0] if w_lo[j] == -CHARGE * a * E['HE'] else [0, -DISCHARGE * E['HP']]
+        if i > 0:
+            gradient -= [DISCHARGE * E['HE'], 0] if w_hi[i] == DISCHARGE * a * E['HE'] else [0, CHARGE * E['HP']]
+        violation, gradient = gap[k] / scale, gradient / scale
+    return violation, gradient
+
+def split_profile(cycle, PARALLEL, E, P_max, bool_neg):
+    # HE power of a split that keeps both packs within their SOC and power limits, or None.
+    # Backwards from the end, every step stays inside the reachable intervals and is as close
+    # as it can be to sharing the power in proportion to the power limits.
+    dt, P, _, scale = cycle
+    l, u, w_lo, w_hi = get_bounds(cycle, PARALLEL, E, P_max, bool_neg)
+    lo, hi, _, _ = get_reachable(dt, l, u, w_lo, w_hi)
+    if max(np.max(lo - hi), np.max((l - u) * dt)) > TOLERANCE * scale:
+        return None
+    limits = PARALLEL['HE'] * P_max['HE'] + PARALLEL['HP'] * P_max['HP']
+    share = PARALLEL['HE'] * P_max['HE'] / limits if limits > 0 else 0.5
+    delivered = np.empty(len(lo))
+    delivered[-1] = 0.5 * (lo[-1] + hi[-1])
+    for k in range(len(P) - 1, -1, -1):
+        lower = max(lo[k], delivered[k + 1] - u[k] * dt[k])
+        upper = min(hi[k], delivered[k + 1] - l[k] * dt[k])
+        delivered[k] = min(max(delivered[k + 1] - share * P[k] * dt[k], lower), upper)
+    return np.clip(np.diff(delivered) / dt, l, u)
+
+def check(candidate):
+    # Power split of every profile for one (PARALLEL_HE, PARALLEL_HP), or None if infeasible
+    PARALLEL = dict(HE=candidate[0], HP=candidate[1])
+    splits = []
+    for cycle in _worker['cycles']:
+        P_HE = split_profile(cycle, PARALLEL, _worker['E'], _worker['P_max'], _worker['bool_neg'])
+        if P_HE is None:
+            return None
+        splits.append(P_HE)
+    return splits
+
+def check_batch(candidates):
+    # Candidates in cost order: number of checks run and the splits of the first feasible one
+    for k, candidate in enumerate(candidates):
+        splits = check(candidate)
+        if splits is not None:
+            return k + 1, splits
+    return len(candidates), None
+
+def get_result(candidate, cost, splits, profiles, cell_HE, cell_HP, SERIES, names=('HE', 'HP')):
+    # Same layout as HBESSProblem.extract, from the power split
+    cells = dict(HE=cell_HE, HP=cell_HP)
+    PARALLEL = dict(HE=candidate[0], HP=candidate[1])
+    result = dict(cost=cost)
+    for name in names:
+        E = SERIES[name] * PARALLEL[name] * cells[name]['E']
+        pack = dict(SERIES=SERIES[name], PARALLEL=PARALLEL[name], P=[], SOC=[], I=[])
+        for (t, P), P_HE in zip(profiles, splits):
+            P_pack = P_HE if name == 'HE' else P - P_HE
+            dSOC = np.cumsum(P_pack * model.get_dt(t)) / (E * 3.6e6) if E > 0 else np.zeros(len(P))
+            pack['P'].append(P_pack)
+            pack['SOC'].append(np.r_[model.SOC_INIT, model.SOC_INIT - dSOC])
+            pack['I'].append(P_pack / (SERIES[name] * cells[name]['V']))
+        result[name] = pack
+    N = sum(len(t) for t, _ in profiles)
+    result['dimensions'] = dict(variables=3 * N + 2 * len(profiles), constraints=2 * N + 2 * len(profiles), parameters=0)
+    return result
+
+def get_minimum(violation, index):
+    # Smallest x >= 0 with violation(x) <= TOLERANCE, for a violation returning (value,
+    # gradient) that is convex, nonincreasing and piecewise linear in x = gradient[index].
+    # Newton steps from the infeasible side never overshoot and stop on the linear piece
+    # through the root; its gradient is returned too (None when x = 0 is feasible).
+    x, piece = 0.0, None
+    for _ in range(MAX_ITER):
+        value, gradient = violation(x)
+        if value <= TOLERANCE:
+            return x, piece
+        if gradient[index] >= 0:
+            raise RuntimeError("No feasible sizing")
+        x, piece = x - value / gradient[index], gradient
+    raise RuntimeError(f"No feasible sizing after {MAX_ITER} Newton steps")
+
+def get_optimum(cost, upper):
+    # Minimum over [0, upper] of a convex, piecewise linear cost returning (value, slope):
+    # cutting planes, each point where the tangents of the bracket ends meet
+    lower = (0.0, *cost(0.0))
+    if lower[2] >= 0:
+        return lower[0]
+    upper = (upper, *cost(upper))
+    if upper[2] <= 0:
+        return upper[0]
+    best = min(lower, upper, key=lambda point: point[1])
+    for _ in range(MAX_ITER):
+        (x_lo, f_lo, s_lo), (x_hi, f_hi, s_hi) = lower, upper
+        x = (f_hi - f_lo + s_lo * x_lo - s_hi * x_hi) / (s_lo - s_hi)
+        if not x_lo < x < x_hi:
+            x = 0.5 * (x_lo + x_hi)
+        point = (x, *cost(x))
+        best = min(best, point, key=lambda point: point[1])
+        if point[1] - max(f_lo + s_lo * (x - x_lo), f_hi + s_hi * (x - x_hi)) <= TOLERANCE * abs(point[1]):
+            break
+        if point[2] < 0:
+            lower = point
+        elif point[2] > 0:
+            upper = point
+        else:
+            break
+    return best[0]
+
+def solve_relaxation(cell_HE, cell_HP, profiles, V_pack, bool_neg, mode='hybrid'):
+    # Continuous sizing at constant cell voltage, the same optimum as the NLP of that mode with
+    # bool_OCV, in HBESSProblem.extract's layout. The cheapest PARALLEL_HP for a given
+    # PARALLEL_HE is the root of the violation (Newton); the total cost along that boundary is
+    # convex in PARALLEL_HE (cutting planes). Monotypes need a single root.
+    start = time.perf_counter()
+    SERIES = dict(HE=get_series(cell_HE, V_pack), HP=get_series(cell_HP, V_pack))
+    price = dict(HE=cell_HE['C'] * SERIES['HE'], HP=cell_HP['C'] * SERIES['HP'])   # per parallel string
+    E, P_max = get_strings(cell_HE, cell_HP, SERIES)
+    cycles = get_cycles(profiles)
+    evaluations = 0
+
+    def violation(PARALLEL_HE, PARALLEL_HP):
+        nonlocal evaluations
+        evaluations += 1
+        return get_violation(cycles, dict(HE=PARALLEL_HE, HP=PARALLEL_HP), E, P_max, bool_neg)
+
+    def get_HP(PARALLEL_HE):
+        # Cheapest PARALLEL_HP for PARALLEL_HE, and the slope of the total cost along the
+        # boundary piece there (PARALLEL_HP stays zero for a larger PARALLEL_HE)
+        PARALLEL_HP, piece = get_minimum(lambda x: violation(PARALLEL_HE, x), 1)
+        slope = price['HE'] - price['HP'] * piece[0] / piece[1] if piece is not None else price['HE']
+        return PARALLEL_HP, slope
+
+    if mode == 'HP':
+        PARALLEL = dict(HE=0.0, HP=get_HP(0.0)[0])
+    else:
+        PARALLEL_HE, _ = get_minimum(lambda x: violation(x, 0.0), 0)
+        if mode == 'hybrid':
+            def cost(x):
+                PARALLEL_HP, slope = get_HP(x)
+                return price['HE'] * x + price['HP'] * PARALLEL_HP, slope
+            PARALLEL_HE = get_optimum(cost, PARALLEL_HE)
+        PARALLEL = dict(HE=PARALLEL_HE, HP=get_HP(PARALLEL_HE)[0] if mode == 'hybrid' else 0.0)
+
+    splits = [split_profile(cycle, PARALLEL, E, P_max, bool_neg) for cycle in cycles]
+    if any(split is None for split in splits):
+        raise RuntimeError("No feasible power split at the optimal sizing")
+    names = ('HE', 'HP') if mode == 'hybrid' else (mode,)
+    result = get_result((PARALLEL['HE'], PARALLEL['HP']), price['HE'] * PARALLEL['HE'] + price['HP'] * PARALLEL['HP'],
+                        splits, profiles, cell_HE, cell_HP, SERIES, names)
+    result['stats'] = dict(return_status='Solve_Succeeded', iter_count=evaluations, success=True,
+                           t_wall_total=time.perf_counter() - start, solver=LABEL)
+    return result
+
+def solve(cell_HE, cell_HP, profiles, V_pack, bool_neg, workers=None):
+    # Cheapest integer (PARALLEL_HE, PARALLEL_HP) with a feasible power split. Candidates come
+    # off a heap in order of increasing cost; the peak power and SOC window of the combined
+    # packs screen out most of them before the full check. The first round runs in this
+    # process, worker processes are only started when it finds no feasible design.
+    start = time.perf_counter()
+    workers = workers or os.cpu_count()
+    SERIES = dict(HE=get_series(cell_HE, V_pack), HP=get_series(cell_HP, V_pack))
+    price = dict(HE=cell_HE['C'] * SERIES['HE'], HP=cell_HP['C'] * SERIES['HP'])   # per parallel string
+    args = (cell_HE, cell_HP, profiles, SERIES, bool_neg)
+    init_worker(*args)
+    pool = None
+
+    requirements = get_requirements(profiles)
+    heap = [(0, (0, 0))]
+    seen = {(0, 0)}
+    candidates = screened = checks = 0
+    found = None
+    try:
+        while found is None:
+            if candidates >= MAX_CANDIDATES:
+                raise RuntimeError(f"No feasible design among the {candidates} cheapest candidates")
+            # Next candidates in cost order, screened by necessary conditions
+            batch = []
+            while len(batch) < BATCH * workers and candidates < MAX_CANDIDATES:
+                cost, candidate = heapq.heappop(heap)
+                for neighbour in ((candidate[0] + 1, candidate[1]), (candidate[0], candidate[1] + 1)):
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        heapq.heappush(heap, (price['HE'] * neighbour[0] + price['HP'] * neighbour[1], neighbour))
+                candidates += 1
+                E, P_max = get_limits(dict(HE=candidate[0], HP=candidate[1]))
+                E_total = E['HE'] + E['HP']
+                if all(peak <= P_max['HE'] + P_max['HP']
+                       and discharge <= (model.SOC_INIT - model.SOC_MIN) * E_total
+                       and charge <= (model.SOC_MAX - model.SOC_INIT) * E_total
+                       for peak, discharge, charge in requirements):
+                    batch.append((cost, candidate))
+                else:
+                    screened += 1
+
+            # Contiguous chunks of the batch, one per worker; the batch is in cost order, so the
+            # first feasible design of the first chunk that has one is the cheapest overall
+            if checks and workers > 1 and pool is None:
+                # spawn: forking a threaded server process is unsafe; one BLAS thread per worker avoids oversubscription
+                os.environ.setdefault('OMP_NUM_THREADS', '1')
+                pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                           initializer=init_worker, initargs=args)
+            chunks = [[batch[k] for k in index] for index in np.array_split(np.arange(len(batch)), workers if pool else 1)]
+            evaluate = pool.map if pool else map
+            for chunk, (checked, splits) in zip(chunks, evaluate(check_batch, [[candidate for _, candidate in chunk] for chunk in chunks])):
+                checks += checked
+                if splits is not None:
+                    found = (*chunk[checked - 1], splits)
+                    break
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    cost, candidate, splits = found
+    result = get_result(candidate, cost, splits, profiles, cell_HE, cell_HP, SERIES)
+    result['stats'] = dict(status='optimal', gap=0.0, candidates=candidates, screened=screened, checks=checks,
+                           workers=workers if pool else 1, elapsed=time.perf_counter() - start, solver=LABEL)
+    return result
@@ -3,13 +3,6 @@ import altair as alt
 color_range = ["#0072BD", "#D95319", "#EDB120"]
 color_range = ['#95C11E', '#5BC5F1', '#0096A9']
 
-def get_SOC(P, E, dt):
-    # P     [W]
-    # E     [kWh]
-    # dt    [s]
-    dSOC = P*(dt)/(E*3.6e6)
-    return dSOC
-
 def plot_power(df_load):
     # Scale inputs
     chart_data = df_load.copy()                                  #copy of DataFrame for scaling
@@ -55,7 +48,7 @@ def plot_powers(df_loads):
     # Create chart object
     chart = (
         alt.Chart(data = chart_data)
-        .mark_line(interpolate='linear')
+        .mark_line(interpolate='step-after')
         .encode(
         x = alt.X('t', axis = alt.Axis(title = 'Time (min)', grid = True)),
         y = alt.Y('value', axis = alt.Axis(title = 'Power (kW)')),
@@ -109,7 +102,7 @@ def plot_currents(df_current):
     # Create chart object
     chart = (
         alt.Chart(data = chart_data)
-        .mark_line(interpolate='linear')
+        .mark_line(interpolate='step-after')
         .encode(
         x = alt.X('t', axis = alt.Axis(title = 'Time (min)', grid = True)),
         y = alt.Y('value', axis = alt.Axis(title = 'Current (A)')),
@@ -152,6 +145,27 @@ def plot_voltages(df_voltage):
     return chart
 
 
+def plot_sweep(df_sweep):
+    # Scale inputs
+    chart_data = df_sweep.loc[:, ['V_pack', 'cost']].dropna()
+    chart_data['cost'] = chart_data['cost'] / 1000                    #euro to thousand euro
+
+    # Create chart object
+    chart = (
+        alt.Chart(data = chart_data)
+        .mark_line(interpolate='linear', point=True, color=color_range[0])
+        .encode(
+        x = alt.X('V_pack', axis = alt.Axis(title = 'Nominal pack voltage (V)', grid = True)),
+        y = alt.Y('cost', axis = alt.Axis(title = 'Total cost (k€)'), scale=alt.Scale(zero=False)),
+        tooltip = ['V_pack', 'cost']
+        )
+        .properties(
+            height = 380,
+        )
+        .interactive()
+    )
+    return chart
+
 
 def display_pack(df_pack):
     styler = df_pack.style
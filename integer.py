@@ -0,0 +1,135 @@
+import heapq
+import itertools
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import model
+
+QUIET = dict(model.SOLVER, verbose=False)
+FIELDS = ('SERIES_HE', 'PARALLEL_HE', 'SERIES_HP', 'PARALLEL_HP')
+TOLERANCE = 1e-6        # distance to the nearest integer that still counts as integral
+TIME_LIMIT = 60         # s
+GAP = 1e-4              # relative optimality gap at which the search stops
+
+# Node problem and inputs of this process, set by init_worker
+_worker = {}
+
+def init_worker(cell_HE, cell_HP, profiles, V_pack, bool_neg, bool_OCV, bool_voltage, solver):
+    _worker.clear()
+    _worker['args'] = (cell_HE, cell_HP, profiles, V_pack)
+    _worker['problem'] = model.HBESSProblem('discrete', cell_HE, cell_HP, [len(t) for t, _ in profiles],
+                                            bool_neg, bool_OCV, bool_voltage, solver=solver)
+
+def solve_node(bounds):
+    # Continuous relaxation of one node, warm-started from the previous node solved in this
+    # process; None when it has no feasible point
+    problem = _worker['problem']
+    try:
+        return problem.extract(problem.solve(*_worker['args'], bounds, warm_start=True))
+    except RuntimeError:
+        return None
+
+def get_values(result):
+    return {f'{field}_{name}': result[name][field] for name in ('HE', 'HP') for field in ('SERIES', 'PARALLEL')}
+
+def get_cost(values, cell_HE, cell_HP):
+    # Cost of an integer design, in the same terms as the model objective
+    cells = dict(HE=cell_HE, HP=cell_HP)
+    return sum(cells[name]['C'] * round(values[f'SERIES_{name}']) * round(values[f'PARALLEL_{name}'])
+               for name in ('HE', 'HP'))
+
+def solve(cell_HE, cell_HP, profiles, V_pack, bool_neg, bool_OCV, bool_voltage=True,
+          time_limit=TIME_LIMIT, gap=GAP, workers=None, solver=QUIET, monitor=None, root=None):
+    # Best-first branch-and-bound over the series and parallel counts of both packs.
+    # Every round solves the most promising open nodes in parallel worker processes; a node
+    # is pruned when its relaxation costs at least the best integer design found so far.
+    # The reported gap is between that design and the lowest open relaxation cost. It is a
+    # proof of optimality as far as IPOPT finds the global optimum of each relaxation.
+    # monitor: receives (nodes, best cost or lowest bound, None) after every round and can
+    # cancel the search, see model.Progress
+    # root: result of the root relaxation when already solved, i.e. the hybrid sizing of the same inputs
+    start = time.perf_counter()
+    workers = workers or os.cpu_count()
+    args = (cell_HE, cell_HP, profiles, V_pack, bool_neg, bool_OCV, bool_voltage, solver)
+    if workers == 1:
+        init_worker(*args)
+        pool = None
+        evaluate = lambda batch: list(map(solve_node, batch))
+    else:
+        # spawn: forking a threaded server process is unsafe; one BLAS thread per worker avoids oversubscription
+        os.environ.setdefault('OMP_NUM_THREADS', '1')
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=init_worker, initargs=args)
+        evaluate = lambda batch: list(pool.map(solve_node, batch))
+
+    counter = itertools.count()
+    heap = []           # (lower bound from the parent, tie breaker, node bounds)
+    seen = set()
+    incumbent, upper = None, math.inf
+    nodes = infeasible = 0
+
+    def push(bound, bounds):
+        key = tuple(sorted(bounds.items()))
+        if key not in seen:
+            seen.add(key)
+            heapq.heappush(heap, (bound, next(counter), bounds))
+
+    def expand(bounds, result):
+        # Incumbent or children of a solved node
+        nonlocal incumbent, upper, nodes, infeasible
+        nodes += 1
+        if result is None:
+            infeasible += 1
+            return
+        if result['cost'] >= upper * (1 - gap):
+            return
+        values = get_values(result)
+        fractional = {field: value for field, value in values.items()
+                      if abs(value - round(value)) > TOLERANCE}
+        if not fractional:
+            incumbent, upper = result, get_cost(values, cell_HE, cell_HP)
+            return
+        # Rounding every fractional count up is usually feasible and gives an early incumbent
+        push(result['cost'], {field: (math.ceil(value),) * 2 if field in fractional else (round(value),) * 2
+                              for field, value in values.items()})
+        # Branch on the most fractional count
+        field = max(fractional, key=lambda field: min(fractional[field] % 1, 1 - fractional[field] % 1))
+        lower, upper_bound = bounds[field]
+        push(result['cost'], dict(bounds, **{field: (lower, math.floor(fractional[field]))}))
+        push(result['cost'], dict(bounds, **{field: (math.ceil(fractional[field]), upper_bound)}))
+
+    bounds = {field: (0, model.UNBOUNDED) for field in FIELDS}
+    if root is None:
+        push(0.0, bounds)
+    else:
+        seen.add(tuple(sorted(bounds.items())))
+        expand(bounds, root)
+
+    try:
+        while heap and heap[0][0] < upper * (1 - gap) and time.perf_counter() - start < time_limit:
+            if monitor is not None and monitor.cancelled:
+                raise model.Cancelled('Integer search cancelled')
+            batch = [heapq.heappop(heap) for _ in range(min(workers, len(heap)))]
+            batch = [node for node in batch if node[0] < upper * (1 - gap)]
+            for (_, _, bounds), result in zip(batch, evaluate([bounds for _, _, bounds in batch])):
+                expand(bounds, result)
+            if monitor is not None:
+                monitor.update(nodes, upper if incumbent is not None else heap[0][0] if heap else math.nan, None)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    if incumbent is None:
+        raise RuntimeError(f"No integer design found after {nodes} nodes")
+    open_bounds = [bound for bound, _, _ in heap if bound < upper]
+    bound = min(open_bounds, default=upper)
+    result = dict(incumbent, cost=upper)
+    for name in ('HE', 'HP'):
+        result[name] = dict(incumbent[name], SERIES=round(incumbent[name]['SERIES']),
+                            PARALLEL=round(incumbent[name]['PARALLEL']))
+    result['stats'] = dict(status='optimal' if not open_bounds or bound >= upper * (1 - gap) else 'time limit',
+                           gap=(upper - bound) / upper, bound=bound, nodes=nodes, infeasible=infeasible,
+                           workers=workers, elapsed=time.perf_counter() - start, solver=model.get_label(solver))
+    return result
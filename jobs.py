@@ -0,0 +1,313 @@
+import multiprocessing
+import os
+import queue as queues
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, wait
+import metrics
+import model
+
+HISTORY = 500           # iterates kept per solve for the progress chart
+WORKERS = int(os.environ.get('HBESS_SOLVE_WORKERS', os.cpu_count()))     # solves running at once, per process
+# Solves go to worker processes (run), one per scheduler thread: IPOPT serialises MUMPS calls
+# across threads, so threads alone do not solve in parallel. 0: solve in the scheduler threads.
+PROCESSES = os.environ.get('HBESS_SOLVE_PROCESSES', '1') != '0'
+POLL = 0.1              # s between progress relays of a solve in a worker process
+
+class Monitor:
+    # Progress of a running solve, written by the solver callbacks and read by the page
+    #   history: (iteration, objective, infeasibility) of its latest iterates
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.history = deque(maxlen=HISTORY)
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def cancel(self):
+        self.event.set()
+
+    def update(self, iteration, objective, infeasibility):
+        with self.lock:
+            self.history.append((iteration, objective, infeasibility))
+
+    def get(self):
+        with self.lock:
+            return list(self.history)
+
+class RemoteMonitor:
+    # Monitor of a solve in a worker process: iterates are queued for run to relay, the
+    # cancel flag is read through the manager of the calling process
+
+    def __init__(self, queue, event):
+        self.queue = queue
+        self.event = event
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def update(self, iteration, objective, infeasibility):
+        self.queue.put((iteration, objective, infeasibility))
+
+_pool = None
+_manager = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    # Worker processes shared by all scheduler threads, replaced once broken by a crashed solve
+    global _pool, _manager
+    with _pool_lock:
+        if _pool is None or _pool._broken:
+            # spawn: forking a threaded server process is unsafe; one BLAS thread per worker avoids oversubscription
+            os.environ.setdefault('OMP_NUM_THREADS', '1')
+            context = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(WORKERS, mp_context=context)
+            _manager = _manager or context.Manager()
+        return _pool, _manager
+
+def run(function, *args, monitor=None):
+    # function(*args, monitor) in a worker process, its iterates relayed to monitor, which can cancel it;
+    # in the calling thread when PROCESSES is off
+    if not PROCESSES:
+        return function(*args, monitor)
+    pool, manager = get_pool()
+    remote = RemoteMonitor(manager.Queue(), manager.Event()) if monitor is not None else None
+    future = pool.submit(function, *args, remote)
+    while True:
+        done = bool(wait([future], POLL).done)
+        if remote is not None:
+            if monitor.cancelled:
+                remote.event.set()
+            try:
+                while True:
+                    monitor.update(*remote.queue.get_nowait())
+            except queues.Empty:
+                pass
+        if done:
+            return future.result()
+
+class Ticket:
+    # One solve in the queue, shared by every job that asked for the same inputs
+    #   state: 'queued', 'running' or 'done'; result or error once done
+
+    def __init__(self, key, user, solve):
+        self.key = key
+        self.user = user
+        self.solve = solve          # solve(monitor) returns a result
+        self.monitor = Monitor()
+        self.subscribers = 1        # jobs waiting for it
+        self.state = 'queued'
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = threading.Event()
+        self.callbacks = []
+
+    @property
+    def done(self):
+        return self.finished.is_set()
+
+    def finish(self, result=None, error=None):
+        self.result, self.error, self.state = result, error, 'done'
+        self.finished.set()
+        for callback in self.callbacks:
+            callback(self)
+
+class Scheduler:
+    # Bounded pool of solver threads shared by all sessions of the process.
+    # A solve whose input key is already queued or running is merged onto that ticket. The next
+    # ticket to start is taken from the users in turn, so one user's batch never starves the others.
+
+    def __init__(self, workers=WORKERS):
+        self.workers = workers
+        self.lock = threading.Condition()
+        self.queues = OrderedDict()     # user: deque of queued tickets, users in turn order
+        self.tickets = {}               # key: ticket queued or running
+        self.running = 0
+        for k in range(workers):
+            threading.Thread(target=self.work, name=f'hbess-solver-{k}', daemon=True).start()
+
+    def submit(self, user, key, solve):
+        with self.lock:
+            ticket = self.tickets.get(key)
+            if ticket is not None and not ticket.monitor.cancelled:
+                ticket.subscribers += 1
+                return ticket
+            ticket = Ticket(key, user, solve)
+            self.tickets[key] = ticket
+            self.queues.setdefault(user, deque()).append(ticket)
+            self.lock.notify()
+        return ticket
+
+    def release(self, ticket):
+        # One job no longer needs ticket; the last one out cancels it
+        with self.lock:
+            if ticket.done:
+                return
+            ticket.subscribers -= 1
+            if ticket.subscribers > 0:
+                return
+            if ticket.state == 'running':
+                ticket.monitor.cancel()     # stops after the current iteration
+                return
+            self.dequeue(ticket)
+            del self.tickets[ticket.key]
+        ticket.finish(error=model.Cancelled('Cancelled while queued'))
+
+    def dequeue(self, ticket):
+        queue = self.queues[ticket.user]
+        queue.remove(ticket)
+        if not queue:
+            del self.queues[ticket.user]
+
+    def wait(self, user, key, solve, monitor):
+        # Result of another solve needed by a running one: merged onto its ticket like a submit, run in
+        # the calling thread if still queued, so waiting solves never hold every worker thread
+        ticket = self.submit(user, key, solve)
+        with self.lock:
+            queued = ticket.state == 'queued'
+            if queued:
+                self.dequeue(ticket)
+                self.start(ticket)
+        try:
+            if queued:
+                self.execute(ticket)
+            while not ticket.finished.wait(POLL):
+                if monitor.cancelled:
+                    raise model.Cancelled('Cancelled while waiting')
+        finally:
+            self.release(ticket)
+        if ticket.error is not None:
+            raise ticket.error
+        return ticket.result
+
+    def get_order(self):
+        # Queued tickets in the order they will start, as long as nothing else is submitted
+        queues = [list(queue) for queue in self.queues.values()]
+        return [queue[k] for k in range(max(map(len, queues), default=0)) for queue in queues if k < len(queue)]
+
+    def get_position(self, ticket):
+        # 1-based place of a queued ticket in the start order, and the number of queued tickets
+        with self.lock:
+            order = self.get_order()
+        return (order.index(ticket) + 1 if ticket in order else None), len(order)
+
+    def get_depth(self):
+        # Queued and running solves
+        with self.lock:
+            return sum(map(len, self.queues.values())), self.running
+
+    def work(self):
+        while True:
+            with self.lock:
+                while not self.queues:
+                    self.lock.wait()
+                user, queue = next(iter(self.queues.items()))
+                ticket = queue.popleft()
+                del self.queues[user]
+                if queue:
+                    self.queues[user] = queue       # to the back of the turn order
+                self.start(ticket)
+            self.execute(ticket)
+
+    def start(self, ticket):
+        # Called with the lock held
+        ticket.state, ticket.started = 'running', time.time()
+        self.running += 1
+
+    def execute(self, ticket):
+        result = error = None
+        try:
+            result = ticket.solve(ticket.monitor)
+        except Exception as error_:     # the worker thread outlives any failing solve
+            error = error_
+        with self.lock:
+            self.running -= 1
+            if self.tickets.get(ticket.key) is ticket:     # a cancelled ticket may have been replaced
+                del self.tickets[ticket.key]
+        ticket.finish(result, error)
+
+_scheduler = None
+_lock = threading.Lock()
+
+def get_scheduler():
+    global _scheduler
+    with _lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+    return _scheduler
+
+class Job:
+    # The solves of one run of the page, queued on the shared scheduler
+    #   key: hash of the inputs the results belong to
+    #   tasks: [(name, key, solve)], key identifies the inputs of the solve, solve(monitor) returns a result
+    #   user: whose turn the solves take in the queue
+
+    def __init__(self, key, tasks, label='', user=None, scheduler=None):
+        self.key = key
+        self.label = label          # solver configuration, for the failure records
+        self.scheduler = scheduler or get_scheduler()
+        self.started = time.time()
+        self.tickets = {}
+        self.released = False
+        self.submitted = False
+        for name, task_key, solve in tasks:
+            self.tickets[name] = ticket = self.scheduler.submit(user, task_key, solve)
+            ticket.callbacks.append(self.on_finish)
+        self.submitted = True
+        self.on_finish()
+
+    def on_finish(self, ticket=None):
+        # Solver statistics of the job exported once its last solve is done
+        if self.submitted and not self.released and self.done:
+            metrics.export(self.runs)
+
+    @property
+    def names(self):
+        return list(self.tickets)
+
+    @property
+    def done(self):
+        # A cancelled job is done at once, solves still running for other jobs are not waited for
+        return self.released or all(ticket.done for ticket in self.tickets.values())
+
+    @property
+    def results(self):
+        return {name: ticket.result for name, ticket in self.tickets.items() if ticket.done and ticket.error is None}
+
+    @property
+    def failures(self):
+        # {name: error} of the solves that failed or were cancelled
+        failures = {name: ticket.error for name, ticket in self.tickets.items() if ticket.done and ticket.error is not None}
+        if self.released:
+            failures.update({name: model.Cancelled('Cancelled') for name, ticket in self.tickets.items()
+                             if not ticket.done})
+        return failures
+
+    @property
+    def cancelled(self):
+        return any(isinstance(error, model.Cancelled) for error in self.failures.values())
+
+    @property
+    def runs(self):
+        # Results plus a record of every failed solve, for the solver statistics
+        runs = dict(self.results)
+        for name, error in self.failures.items():
+            status = 'cancelled' if isinstance(error, model.Cancelled) else 'failed'
+            runs[name] = dict(stats=dict(return_status=status, success=False, solver=self.label))
+        return {name: runs[name] for name in self.tickets if name in runs}
+
+    def cancel(self):
+        # Solves shared with other jobs go on for them
+        if self.done:
+            return
+        self.released = True
+        for ticket in self.tickets.values():
+            self.scheduler.release(ticket)
+        metrics.export(self.runs)
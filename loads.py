@@ -0,0 +1,92 @@
+import hashlib
+import io
+import os
+import numpy        as np
+import pandas       as pd
+import cache
+
+# Bundled duty cycles, in tab order
+PROFILES = [('Primary Load Profile', 'tug_boat_1.csv'), ('Secondary Load Profile', 'tug_boat_2.csv')]
+COLUMNS = {'time (s)': 't', 'power (W)': 'P'}
+CHUNK_SIZE = int(os.environ.get('HBESS_CHUNK_SIZE', 2**16))     # rows per read
+
+def read_profile(path, factor=1):
+    # Load profile as a DataFrame with columns t [s] and P [W], cached per file version
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, factor)
+    return cache.profiles.get_or_create(key, lambda: parse_profile(path, factor))
+
+def read_upload(file, factor=1):
+    # Uploaded profile (file-like), cached per content
+    data = file.getvalue()
+    key = ('upload', hashlib.sha256(data).hexdigest(), factor)
+    return cache.profiles.get_or_create(key, lambda: parse_profile(io.BytesIO(data), factor))
+
+def parse_profile(source, factor=1):
+    if factor == 1:
+        # Parsed straight into the final float columns
+        return pd.read_csv(source, usecols=list(COLUMNS), dtype=float).rename(columns=COLUMNS)
+    # Streamed: only one chunk of the full-resolution profile is held at a time
+    t, P = zip(*downsample(read_chunks(source), factor))
+    return pd.DataFrame(dict(t=np.concatenate(t), P=np.concatenate(P)), copy=False)
+
+def read_chunks(source, chunksize=CHUNK_SIZE):
+    # Profile as consecutive (t, P) float arrays; only one chunk of the file is parsed at a time
+    for chunk in pd.read_csv(source, usecols=list(COLUMNS), dtype=float, chunksize=chunksize):
+        yield chunk['time (s)'].to_numpy(), chunk['power (W)'].to_numpy()
+
+def compress(edges, P, factor):
+    # Every bin of factor samples becomes its highest and lowest sample, with their own
+    # durations, plus one remainder segment carrying the rest of the bin energy.
+    #   edges: sample start times and the end time of the last sample [s]
+    dt = np.diff(edges).reshape(-1, factor)
+    P = P.reshape(-1, factor)
+    rows = np.arange(P.shape[0])
+    i_max, i_min = P.argmax(axis=1), P.argmin(axis=1)
+    first, last = np.minimum(i_max, i_min), np.maximum(i_max, i_min)
+    flat = i_max == i_min                                           # constant bins stay one segment
+
+    duration = np.stack([dt.sum(axis=1) - dt[rows, first] - dt[rows, last], dt[rows, first], dt[rows, last]], axis=1)
+    duration[flat, 1:] = 0
+    duration[flat, 0] = dt[flat].sum(axis=1)
+    power = np.stack([np.zeros(len(rows)), P[rows, first], P[rows, last]], axis=1)
+    energy = (P * dt).sum(axis=1) - (power[:, 1:] * duration[:, 1:]).sum(axis=1)
+    rest = duration[:, 0] > 0
+    power[rest, 0] = energy[rest] / duration[rest, 0]
+
+    start = edges[:-1:factor, None] + np.cumsum(duration, axis=1) - duration
+    keep = duration > 0
+    return start[keep], power[keep]
+
+def downsample(chunks, factor):
+    # Streaming peak- and energy-preserving resampling: N shrinks about factor/3 times while
+    # the bin energies, the maximum and minimum power and their durations are kept exactly.
+    # A closing zero-power sample keeps the duration of the last segment.
+    t_rest, P_rest = np.empty(0), np.empty(0)
+    for t, P in chunks:
+        t, P = np.concatenate([t_rest, t]), np.concatenate([P_rest, P])
+        n = (len(t) - 1) // factor * factor        # complete bins whose end time is known
+        if n:
+            yield compress(t[:n + 1], P[:n], factor)
+        t_rest, P_rest = t[n:], P[n:]
+    if len(t_rest) > 1:
+        t_end = t_rest[-1] + (t_rest[-1] - t_rest[-2])
+    else:
+        t_end = t_rest[-1] + (t_rest[-1] - t[n - 1])     # previous sample is in the last full bin
+    yield compress(np.append(t_rest, t_end), P_rest, len(t_rest))
+    yield np.array([t_end]), np.zeros(1)
+
+def merge(t, P):
+    # Runs of equal power become one variable-length step, which get_dt integrates exactly.
+    # The last two samples are kept, so the extrapolated duration of the final one is unchanged.
+    keep = np.ones(len(P), dtype=bool)
+    keep[1:] = P[1:] != P[:-1]
+    keep[-2:] = True
+    return t[keep], P[keep]
+
+def get_scenario(name, df_load, bool_merge=False):
+    # One duty cycle; all scenarios of a problem share the pack sizing
+    t, P = df_load['t'].values, df_load['P'].values
+    if bool_merge:
+        t, P = merge(t, P)
+    return dict(name=name, df=df_load, t=t, P=P)
@@ -0,0 +1,81 @@
+import json
+import os
+import time
+
+# Solver statistics of every solve in one flat layout, exported as JSON or in the Prometheus
+# text format. With HBESS_METRICS set, the app rewrites that file after every run, for the
+# node_exporter textfile collector or any scraper reading it.
+PATH = os.environ.get('HBESS_METRICS')
+PREFIX = 'hbess_solve'
+# CasADi timers (t_wall_<function>) grouped by what IPOPT evaluates in an iteration
+PHASES = {'objective': ('nlp_f', 'nlp_grad_f'), 'constraints': ('nlp_g',), 'jacobian': ('nlp_jac_g',),
+          'hessian': ('nlp_hess_l',)}
+
+def get_metrics(result):
+    # Outcome, effort and time split of one result (NLP, branch-and-bound or linear fast path)
+    stats = result['stats']
+    status = stats.get('return_status', stats.get('status'))
+    total = stats.get('t_wall_total', stats.get('elapsed'))
+    phases = {}
+    if any(f't_wall_{function}' in stats for functions in PHASES.values() for function in functions):
+        phases = {phase: sum(stats.get(f't_wall_{function}', 0.0) for function in functions)
+                  for phase, functions in PHASES.items()}
+        # Rest of the solver time: KKT factorisations and solves, line search, bookkeeping
+        phases['linear_algebra'] = max(total - sum(phases.values()), 0.0)
+    return dict(solver=stats.get('solver', ''), status=status, success=bool(stats.get('success', status == 'optimal')),
+                iterations=stats.get('iter_count', stats.get('nodes', stats.get('checks'))), time=total, phases=phases,
+                calls={function: stats[f'n_call_{function}'] for functions in PHASES.values() for function in functions
+                       if f'n_call_{function}' in stats},
+                **result.get('dimensions', {}))
+
+def to_json(runs):
+    # runs: {name: result}
+    return json.dumps(dict(timestamp=time.time(), runs={name: get_metrics(result) for name, result in runs.items()}),
+                      indent=1, default=str)
+
+def get_labels(**labels):
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels.items()) + '}'
+
+def to_prometheus(runs):
+    # Text exposition format, one sample per run and metric, labelled with the run and solver configuration
+    timestamp = time.time()
+    families = {
+        'success': ('gauge', '1 if the solve converged, 0 otherwise'),
+        'iterations': ('gauge', 'Solver iterations (branch-and-bound nodes, feasibility checks)'),
+        'seconds': ('gauge', 'Wall time of the solve'),
+        'phase_seconds': ('gauge', 'Wall time of the solve per phase'),
+        'variables': ('gauge', 'Decision variables of the NLP'),
+        'constraints': ('gauge', 'Constraints of the NLP'),
+        'info': ('gauge', 'Return status of the solve'),
+        'timestamp_seconds': ('gauge', 'Unix time of the export'),
+    }
+    samples = {family: [] for family in families}
+    for name, result in runs.items():
+        values = get_metrics(result)
+        labels = dict(run=name, solver=values['solver'])
+        samples['success'].append((labels, int(values['success'])))
+        samples['info'].append((dict(labels, status=values['status']), 1))
+        samples['timestamp_seconds'].append((labels, timestamp))
+        for family in ('iterations', 'variables', 'constraints'):
+            if values.get(family) is not None:
+                samples[family].append((labels, values[family]))
+        if values['time'] is not None:
+            samples['seconds'].append((labels, values['time']))
+        for phase, seconds in values['phases'].items():
+            samples['phase_seconds'].append((dict(labels, phase=phase), seconds))
+    lines = []
+    for family, (kind, description) in families.items():
+        if samples[family]:
+            lines += [f'# HELP {PREFIX}_{family} {description}', f'# TYPE {PREFIX}_{family} {kind}']
+            lines += [f'{PREFIX}_{family}{get_labels(**labels)} {value}' for labels, value in samples[family]]
+    return '\n'.join(lines) + '\n'
+
+def export(runs, path=PATH):
+    # Prometheus text of runs to path, replaced atomically so a scrape never reads half a file
+    if not path:
+        return
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as file:
+        file.write(to_prometheus(runs))
+    os.replace(temporary, path)
@@ -0,0 +1,348 @@
+import ctypes.util
+import threading
+import casadi       as ca
+import numpy        as np
+import codegen
+
+SOC_INIT = 0.9
+SOC_MIN = 0.1
+SOC_MAX = 0.9
+PARALLEL_INIT = dict(HE=16, HP=25)
+UNBOUNDED = 1e20        # parameter values must be finite, IPOPT drops bounds beyond 1e19
+MODES = ('hybrid', 'HE', 'HP', 'discrete')
+# Solver configuration of a run, turned into CasADi options by get_solver_options
+#   backend: NLP solver plugin bundled with CasADi, one of BACKENDS
+#   linear_solver: IPOPT's sparse symmetric solver, one of get_linear_solvers()
+#   hessian: 'exact' or 'limited-memory' (L-BFGS approximation)
+#   tol, max_iter: convergence tolerance and iteration limit
+#   verbose: solver log on the console, which itself takes time on long runs
+SOLVER = dict(backend='ipopt', linear_solver='mumps', hessian='exact', tol=1e-8, max_iter=3000, verbose=True)
+BACKENDS = tuple(backend for backend in ('ipopt', 'sqpmethod') if ca.has_nlpsol(backend))
+HESSIANS = ('exact', 'limited-memory')
+HSL_SOLVERS = ('ma27', 'ma57', 'ma77', 'ma86', 'ma97')
+_interpolants = {}
+WARM_START_OPTIONS = {"warm_start_init_point": "yes", "warm_start_bound_push": 1e-6,
+                      "warm_start_mult_bound_push": 1e-6, "mu_init": 1e-5}
+
+def get_t_SOC(t):
+    # SOC is sampled at every profile timestamp plus one extra step past the end
+    t = np.asarray(t, dtype=float)
+    return np.append(t, t[-1] + (t[-1] - t[-2]))
+
+def get_dt(t):
+    # Duration of every profile sample [s]
+    return np.diff(get_t_SOC(t))
+
+def get_linear_solvers():
+    # MUMPS ships with CasADi's IPOPT, the HSL solvers are loaded from libhsl at run time
+    if ctypes.util.find_library('hsl') or ctypes.util.find_library('coinhsl'):
+        return ('mumps',) + HSL_SOLVERS
+    return ('mumps',)
+
+def get_solver_options(solver):
+    # CasADi plugin and options of a solver configuration (missing keys from SOLVER).
+    # Timings are always recorded so that runs can be compared.
+    solver = dict(SOLVER, **solver)
+    verbose = solver['verbose']
+    options = dict(print_time=verbose, record_time=True, show_eval_warnings=verbose)
+    if solver['backend'] == 'ipopt':
+        options['ipopt'] = dict(print_level=5 if verbose else 0, sb='no' if verbose else 'yes',
+                                linear_solver=solver['linear_solver'], hessian_approximation=solver['hessian'],
+                                tol=solver['tol'], max_iter=solver['max_iter'])
+    elif solver['backend'] == 'sqpmethod':
+        # qrqp is CasADi's own QP solver; exact Hessians of this nonconvex NLP need regularizing
+        options.update(qpsol='qrqp', qpsol_options=dict(print_iter=False, print_header=False, error_on_fail=False),
+                       hessian_approximation=solver['hessian'],
+                       convexify_strategy='regularize' if solver['hessian'] == 'exact' else 'none',
+                       tol_pr=solver['tol'], tol_du=solver['tol'], max_iter=solver['max_iter'],
+                       print_header=verbose, print_iteration=verbose, print_status=verbose)
+    else:
+        raise ValueError(f"Unknown solver backend: {solver['backend']}")
+    return solver['backend'], options
+
+def get_label(solver):
+    # Short description of a solver configuration, attached to the stats of every result
+    solver = dict(SOLVER, **solver)
+    parts = [solver['backend']]
+    if solver['backend'] == 'ipopt':
+        parts.append(solver['linear_solver'])
+    parts += [f"{solver['hessian']} Hessian", f"tol {solver['tol']:g}"]
+    if not solver['verbose']:
+        parts.append('silent')
+    return ', '.join(parts)
+
+def get_opti_options(options):
+    # Variable bounds (SOC limits, P >= 0, ...) go to IPOPT as bounds instead of constraint rows
+    return dict(options, detect_simple_bounds=True)
+
+def get_warm_options(options):
+    # Solver options with the IPOPT warm-start settings merged in; the SQP methods start
+    # from the given primal/dual point anyway
+    if 'ipopt' not in options:
+        return options
+    return dict(options, ipopt=dict(options['ipopt'], **WARM_START_OPTIONS))
+
+def get_SOC(P, E, dt):
+    # P     [W]
+    # E     [kWh]
+    # dt    [s]
+    dSOC = P*(dt)/(E*3.6e6)
+    return dSOC
+
+def get_interpolant(cell):
+    # OCV lookup table of a cell, built once per process and table
+    key = (tuple(cell['OCV_SOC']), tuple(cell['OCV']))
+    if key not in _interpolants:
+        _interpolants[key] = ca.interpolant('LUT','bspline',[cell['OCV_SOC']], cell['OCV'])
+    return _interpolants[key]
+
+def get_OCV(SOC_TO_OCV, SOC):
+    # Single mapped call of the OCV lookup table over a whole SOC vector
+    N = SOC.shape[0]
+    return SOC_TO_OCV.map(N)(SOC.T).T
+
+def add_SOC(opti, P, E, dt):
+    # SOC trajectory of one pack over one profile, as one vector equality
+    N = P.shape[0]
+    SOC = opti.variable(N+1, 1)
+    opti.subject_to(SOC[0] == SOC_INIT)
+    opti.subject_to(SOC[1:] - SOC[:-1] == -get_SOC(P, E, dt))
+    opti.subject_to(opti.bounded(SOC_MIN, SOC, SOC_MAX))
+    return SOC
+
+def add_current(opti, P, V, I_max):
+    # Elementwise pack current over one profile
+    I = opti.variable(P.shape[0], 1)
+    opti.subject_to(I == P / V)
+    opti.subject_to(I <= I_max)
+    return I
+
+def add_pack(opti, cell, dts, bool_neg, bool_OCV):
+    # One pack (series/parallel sizing) shared by all load profiles
+    SERIES = opti.variable(1, 1)
+    PARALLEL = opti.variable(1, 1)
+    E = SERIES * PARALLEL * cell['E']
+    SOC_TO_OCV = get_interpolant(cell)
+
+    pack = dict(SERIES=SERIES, PARALLEL=PARALLEL, P=[], SOC=[], I=[],
+                cost=cell['C'] * SERIES * PARALLEL)
+    for dt in dts:
+        P = opti.variable(dt.shape[0], 1)
+        if not bool_neg:
+            opti.subject_to(P >= 0)
+        SOC = add_SOC(opti, P, E, dt)
+        if not bool_OCV:
+            V = SERIES * get_OCV(SOC_TO_OCV, SOC[:-1])
+        else:
+            V = SERIES * cell['V']
+        I = add_current(opti, P, V, PARALLEL * cell['I'])
+        pack['P'].append(P)
+        pack['SOC'].append(SOC)
+        pack['I'].append(I)
+    return pack
+
+class Cancelled(RuntimeError):
+    # Solve stopped through its monitor
+    pass
+
+class Progress(ca.Callback):
+    # Solver iteration callback: iteration number, objective and largest constraint violation of
+    # every iterate go to the monitor of the running solve (monitor.update), and the solver stops
+    # (User_Requested_Stop) after the iteration in which monitor.cancelled is set.
+    # Only x and f are read, the other solver outputs are declared empty.
+
+    def __init__(self, opti):
+        ca.Callback.__init__(self)
+        self.nx = opti.nx
+        self.violation = ca.Function('violation', [opti.x, opti.p],
+                                     [ca.mmax(ca.vertcat(0, opti.lbg - opti.g, opti.g - opti.ubg))])
+        self.monitor = None
+        self.p = None
+        self.iteration = 0
+        self.construct('progress', {})
+
+    def start(self, monitor, p):
+        # Report the solve about to start, with parameter values p, to monitor (None: nowhere)
+        self.monitor, self.p, self.iteration = monitor, p, 0
+
+    def get_n_in(self):
+        return ca.nlpsol_n_out()
+
+    def get_n_out(self):
+        return 1
+
+    def get_name_in(self, i):
+        return ca.nlpsol_out(i)
+
+    def get_name_out(self, i):
+        return 'ret'
+
+    def get_sparsity_in(self, i):
+        name = ca.nlpsol_out(i)
+        if name == 'x':
+            return ca.Sparsity.dense(self.nx)
+        if name == 'f':
+            return ca.Sparsity.scalar()
+        return ca.Sparsity(0, 0)
+
+    def eval(self, arg):
+        monitor = self.monitor
+        if monitor is None:
+            return [0]
+        monitor.update(self.iteration, float(arg[1]), float(self.violation(arg[0], self.p)))
+        self.iteration += 1
+        return [int(monitor.cancelled)]
+
+class HBESSProblem:
+    # Sizing NLP built once per structure (mode, profile lengths, flags, OCV tables).
+    # Cell capacity, current and cost, the pack voltage and the load profiles are
+    # opti parameters, so a re-solve only updates values and reuses the solver.
+    #   mode: 'hybrid', 'HE' or 'HP' (monotype), 'discrete' (hybrid with bounds on the
+    #         sizing variables, the node problem of the integer search)
+    #   compiled: solve with C code-generated NLP functions, cached on disk per structure
+    #   solver: solver configuration, see SOLVER
+
+    def __init__(self, mode, cell_HE, cell_HP, N, bool_neg, bool_OCV, bool_voltage=True, compiled=False,
+                 solver=None):
+        self.mode = mode
+        self.structure = self.key(mode, cell_HE, cell_HP, N, bool_neg, bool_OCV, bool_voltage)
+        self.names = ('HE', 'HP') if mode in ('hybrid', 'discrete') else (mode,)
+        self.cells = dict(HE=cell_HE, HP=cell_HP)
+        self.bool_voltage = bool_voltage
+        self.opti = opti = ca.Opti()
+
+        self.dt = [opti.parameter(n, 1) for n in N]
+        self.P = [opti.parameter(n, 1) for n in N]
+        self.params = {}
+        self.packs = {}
+        for name in self.names:
+            cell = self.cells[name]
+            params = dict(Q=opti.parameter(), I=opti.parameter(), C=opti.parameter())
+            self.params[name] = params
+            self.packs[name] = add_pack(opti, dict(cell, **params, E=(params['Q']/1000) * cell['V']),
+                                        self.dt, bool_neg, bool_OCV)
+
+        for k, P in enumerate(self.P):
+            opti.subject_to(sum(pack['P'][k] for pack in self.packs.values()) == P)
+
+        self.V_pack = opti.parameter()
+        self.bounds = {}
+        for name, pack in self.packs.items():
+            if bool_voltage:
+                opti.subject_to(pack['SERIES'] == ca.floor(self.V_pack / self.cells[name]['V'] + 0.5))
+            opti.subject_to(pack['SERIES'] >= 0)
+            opti.subject_to(pack['PARALLEL'] >= 0)
+            if mode == 'discrete':
+                # Lower and upper bound of every sizing variable, set per node
+                self.bounds[name] = {}
+                for field in ('SERIES', 'PARALLEL'):
+                    bounds = (opti.parameter(), opti.parameter())
+                    self.bounds[name][field] = bounds
+                    opti.subject_to(opti.bounded(bounds[0], pack[field], bounds[1]))
+
+        self.objective = sum(pack['cost'] for pack in self.packs.values())   # Total cost of the battery system (eur)
+        opti.minimize(self.objective)
+        self.backend, self.options = get_solver_options(solver or {})
+        self.progress = Progress(opti)
+        self.lock = threading.Lock()     # one solve at a time: the Opti holds the values of the current one
+        self.options['iteration_callback'] = self.progress
+        self.label = get_label(solver or {})
+        opti.solver(self.backend, get_opti_options(self.options))
+        self.solver = codegen.get_solver(opti, self.structure, self.backend, self.options) if compiled else None
+        self.warm_solver = None
+        self.warm = False       # opti currently configured for warm starts
+        self.last = None        # primal/dual solution of the previous solve
+
+    @staticmethod
+    def key(mode, cell_HE, cell_HP, N, bool_neg, bool_OCV, bool_voltage=True):
+        # Everything that changes the symbolic structure of the problem
+        cells = tuple((cell['V'], tuple(cell['OCV']), tuple(cell['OCV_SOC'])) for cell in (cell_HE, cell_HP))
+        return (mode, tuple(N), cells, bool_neg, bool_OCV, bool_voltage)
+
+    def dimensions(self):
+        # Size of the NLP handed to the solver
+        return dict(variables=self.opti.nx, constraints=self.opti.ng, parameters=self.opti.np)
+
+    def extract(self, sol):
+        # Numeric copy of a solution, independent of the symbolic problem
+        result = dict(cost=float(sol.value(self.objective)), stats=dict(sol.stats(), solver=self.label),
+                      dimensions=self.dimensions())
+        for name, pack in self.packs.items():
+            result[name] = dict(SERIES=float(sol.value(pack['SERIES'])), PARALLEL=float(sol.value(pack['PARALLEL'])),
+                                P=[np.atleast_1d(sol.value(P)) for P in pack['P']],
+                                SOC=[np.atleast_1d(sol.value(SOC)) for SOC in pack['SOC']],
+                                I=[np.atleast_1d(sol.value(I)) for I in pack['I']])
+        return result
+
+    def set_values(self, cell_HE, cell_HP, profiles, V_pack, bounds=None):
+        # Parameter values of one solve
+        opti = self.opti
+        cells = dict(HE=cell_HE, HP=cell_HP)
+        for k, (t, P) in enumerate(profiles):
+            opti.set_value(self.dt[k], get_dt(t))
+            opti.set_value(self.P[k], P)
+        opti.set_value(self.V_pack, V_pack if V_pack is not None else 0)
+        for name in self.packs:
+            for field, param in self.params[name].items():
+                opti.set_value(param, cells[name][field])
+            for field, (lower, upper) in self.bounds.get(name, {}).items():
+                # bounds: {'PARALLEL_HE': (lower, upper), ...}, unbounded when missing
+                lower_value, upper_value = (bounds or {}).get(f'{field}_{name}', (0, UNBOUNDED))
+                opti.set_value(lower, lower_value)
+                opti.set_value(upper, upper_value)
+
+    def set_initial(self, cell_HE, cell_HP, V_pack):
+        # Default (cold) initial guess
+        opti = self.opti
+        cells = dict(HE=cell_HE, HP=cell_HP)
+        opti.set_initial(opti.x, 0)
+        opti.set_initial(opti.lam_g, 0)
+        for name, pack in self.packs.items():
+            if self.bool_voltage and V_pack is not None:
+                opti.set_initial(pack['SERIES'], round(V_pack / cells[name]['V']))
+            else:
+                opti.set_initial(pack['SERIES'], 1)
+            opti.set_initial(pack['PARALLEL'], PARALLEL_INIT[name])
+
+    def solve(self, cell_HE, cell_HP, profiles, V_pack, bounds=None, warm_start=False, monitor=None):
+        # Update parameter values and initial guess, then re-solve the prebuilt NLP.
+        # With warm_start, IPOPT starts from the primal/dual solution of the previous
+        # solve and falls back to a cold start if that fails.
+        # monitor: receives every iterate and can cancel the solve, see Progress
+        opti = self.opti
+        self.set_values(cell_HE, cell_HP, profiles, V_pack, bounds)
+        sol = None
+        if warm_start and self.last is not None:
+            opti.set_initial(opti.x, self.last['x'])
+            opti.set_initial(opti.lam_g, self.last['lam_g'])
+            try:
+                sol = self._solve(True, monitor)
+            except Cancelled:
+                raise
+            except RuntimeError:
+                pass
+        if sol is None:
+            self.set_initial(cell_HE, cell_HP, V_pack)
+            sol = self._solve(False, monitor)
+        self.last = dict(x=sol.value(opti.x), lam_g=sol.value(opti.lam_g))
+        return sol
+
+    def _solve(self, warm, monitor=None):
+        opti = self.opti
+        options = get_warm_options(self.options) if warm else self.options
+        self.progress.start(monitor, opti.value(opti.p))
+        try:
+            if self.solver is not None:
+                if warm and self.warm_solver is None:
+                    self.warm_solver = codegen.get_solver(opti, self.structure, self.backend, options)
+                return codegen.solve(opti, self.warm_solver if warm else self.solver)
+            if warm != self.warm:
+                opti.solver(self.backend, get_opti_options(options))
+                self.warm = warm
+            return opti.solve()
+        except RuntimeError as error:
+            if monitor is not None and monitor.cancelled:
+                raise Cancelled('Solve cancelled') from error
+            raise
+        finally:
+            self.progress.start(None, None)
@@ -0,0 +1,155 @@
+import numpy        as np
+import pandas       as pd
+import cache
+import feasibility
+import integer
+import jobs
+import loads
+import model
+import store
+
+# Headless sizing: one set of cells, load profiles and options, solved without any UI.
+# The Streamlit page, cli.py and batch jobs all go through Sizing.
+
+# Default cells of the app
+CELL_HE = dict(Q=50, V=3.67, I=50, C=27,
+               OCV=[3.427, 3.508, 3.588, 3.621, 3.647, 3.684, 3.761, 3.829, 3.917, 4.019, 4.135],
+               OCV_SOC=[0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1])
+CELL_HP = dict(Q=23, V=2.3, I=92, C=20,
+               OCV=[2.067, 2.113, 2.151, 2.183, 2.217, 2.265, 2.326, 2.361, 2.427, 2.516, 2.653],
+               OCV_SOC=[0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1])
+V_PACK = 1000           # V
+
+def get_cell(cell, **values):
+    # Cell with some parameters replaced, and its energy E [kWh] from Q [Ah] and V [V]
+    cell = dict(cell, **values)
+    cell['E'] = (cell['Q']/1000) * cell['V']
+    return cell
+
+def read_profiles(paths, factor=1, bool_merge=True):
+    # Scenarios of the CSV files at paths, see loads.get_scenario
+    return [loads.get_scenario(path, loads.read_profile(path, factor), bool_merge) for path in paths]
+
+class Sizing:
+    # Sizing problem of one set of inputs; results are shared through the in-process cache and
+    # the on-disk store like in the app, solved problems are kept in problems for re-solves
+    #   profiles: [(t, P), ...], sized for together
+    #   solver: solver configuration, see model.SOLVER
+    #   problems: LRU cache of built problems, shared between Sizing objects of one session
+    #   bool_store: read and write the result store
+    #   processes: solve the NLPs in the worker processes of jobs.run, with their own problems
+
+    def __init__(self, cell_HE, cell_HP, profiles, V_pack=V_PACK, bool_neg=False, bool_OCV=False, bool_voltage=True,
+                 solver=None, compiled=False, warm_start=True, problems=None, bool_store=True, processes=False):
+        self.options = dict(cell_HE=cell_HE, cell_HP=cell_HP, profiles=profiles, V_pack=V_pack, bool_neg=bool_neg,
+                            bool_OCV=bool_OCV, bool_voltage=bool_voltage, solver=solver, compiled=compiled,
+                            warm_start=warm_start)
+        self.cell_HE, self.cell_HP = get_cell(cell_HE), get_cell(cell_HP)
+        self.profiles = profiles
+        self.V_pack = V_pack if bool_voltage else None
+        self.bool_neg, self.bool_OCV, self.bool_voltage = bool_neg, bool_OCV, bool_voltage
+        self.solver = dict(model.SOLVER, **(solver or {}))
+        self.compiled = compiled
+        self.warm_start = warm_start
+        self.problems = problems if problems is not None else cache.LRUCache(cache.PROBLEM_CACHE_SIZE)
+        self.bool_store = bool_store
+        self.processes = processes
+
+    def get_problem_key(self, mode, profiles=None):
+        N = [len(t) for t, _ in profiles or self.profiles]
+        return (model.HBESSProblem.key(mode, self.cell_HE, self.cell_HP, N, self.bool_neg, self.bool_OCV,
+                                       self.bool_voltage), self.compiled, tuple(self.solver.items()))
+
+    def build(self, mode, profiles=None):
+        return model.HBESSProblem(mode, self.cell_HE, self.cell_HP, [len(t) for t, _ in profiles or self.profiles],
+                                  self.bool_neg, self.bool_OCV, self.bool_voltage, self.compiled, self.solver)
+
+    def get_problem(self, mode, profiles=None):
+        # Problems are built once per structure and re-solved with new parameter values;
+        # a template prebuilt by warmup.py is taken over when there is one
+        key = self.get_problem_key(mode, profiles)
+        return self.problems.get_or_create(key, lambda: cache.templates.pop(key) or self.build(mode, profiles))
+
+    def get_shared(self, key, solve, mode):
+        # Finished solves are shared by all sessions and persisted on disk, keyed by every input that affects them
+        if not self.bool_store:
+            return solve()
+        return cache.results.get_or_create(key, lambda: store.get_or_solve(key, solve, mode))
+
+    def get_key(self, mode='hybrid', bounds=None, profiles=None):
+        # Store key of solve, also identifying equal solves queued by different sessions (jobs.Scheduler)
+        linear = self.bool_OCV and self.bool_voltage and bounds is None
+        return store.get_key(mode, self.cell_HE, self.cell_HP, profiles or self.profiles, self.V_pack, bounds,
+                             self.bool_neg, self.bool_OCV, self.bool_voltage, None if linear else self.solver)
+
+    def get_integer_key(self, time_limit=integer.TIME_LIMIT, gap=integer.GAP):
+        # Store key of solve_integer; the search limits are part of it
+        settings = dict(time_limit=time_limit, gap=gap)
+        linear = self.bool_OCV and self.bool_voltage
+        return store.get_key('integer', self.cell_HE, self.cell_HP, self.profiles, self.V_pack, settings,
+                             self.bool_neg, self.bool_OCV, self.bool_voltage, None if linear else self.solver)
+
+    def solve(self, mode='hybrid', bounds=None, profiles=None, monitor=None):
+        # Continuous sizing in mode ('hybrid', 'HE' or 'HP'); profiles overrides the profiles of the case,
+        # monitor follows and can cancel the NLP solve (model.Progress)
+        profiles = profiles or self.profiles
+        linear = self.bool_OCV and self.bool_voltage and bounds is None
+        key = self.get_key(mode, bounds, profiles)
+        def solve():
+            if linear:
+                # Linear at constant cell voltage: same optimum without the NLP
+                return feasibility.solve_relaxation(self.cell_HE, self.cell_HP, profiles, self.V_pack, self.bool_neg,
+                                                    mode)
+            if self.processes:
+                return jobs.run(solve_process, self.options, mode, bounds, profiles, monitor=monitor)
+            problem = self.get_problem(mode, profiles)
+            with problem.lock:      # solves of one session may run at once on the scheduler (jobs.py)
+                return problem.extract(problem.solve(self.cell_HE, self.cell_HP, profiles, self.V_pack, bounds,
+                                                     warm_start=self.warm_start, monitor=monitor))
+        return self.get_shared(key, solve, mode)
+
+    def solve_integer(self, time_limit=integer.TIME_LIMIT, gap=integer.GAP, workers=None, monitor=None, seed=None):
+        # Integer series/parallel counts; seed() returns the hybrid result, the root relaxation of
+        # the NLP search, only asked for when the search runs
+        linear = self.bool_OCV and self.bool_voltage
+        key = self.get_integer_key(time_limit, gap)
+        if linear:
+            # Linear power split: cost-ordered enumeration with exact feasibility checks
+            solve = lambda: feasibility.solve(self.cell_HE, self.cell_HP, self.profiles, self.V_pack, self.bool_neg,
+                                              workers)
+        else:
+            solve = lambda: integer.solve(self.cell_HE, self.cell_HP, self.profiles, self.V_pack, self.bool_neg,
+                                          self.bool_OCV, self.bool_voltage, time_limit, gap, workers, self.solver,
+                                          monitor, seed and seed())
+        return self.get_shared(key, solve, 'integer')
+
+# Problems built in this worker process of jobs.run, shared by the solves it gets
+_process = {}
+
+def solve_process(options, mode, bounds, profiles, monitor):
+    # Sizing.solve in a worker process; the calling process reads and writes the result store
+    problems = _process.setdefault('problems', cache.LRUCache(cache.PROBLEM_CACHE_SIZE))
+    return Sizing(**options, problems=problems, bool_store=False).solve(mode, bounds, profiles, monitor)
+
+def get_summary(result):
+    # Cost and pack sizes of a result, JSON-serialisable
+    summary = dict(cost=result['cost'])
+    for name in ('HE', 'HP'):
+        if name in result:
+            summary[f'SERIES_{name}'] = result[name]['SERIES']
+            summary[f'PARALLEL_{name}'] = result[name]['PARALLEL']
+    return summary
+
+def get_series(result, profiles):
+    # Power, current and SOC of every pack per profile, one DataFrame each on the SOC time grid;
+    # power and current are sample values, so the extra SOC step has none
+    frames = []
+    for k, (t, P) in enumerate(profiles):
+        df = pd.DataFrame(dict(t=model.get_t_SOC(t), P=np.append(P, np.nan)))
+        for name in ('HE', 'HP'):
+            if name in result:
+                df[f'P_{name}'] = np.append(result[name]['P'][k], np.nan)
+                df[f'I_{name}'] = np.append(result[name]['I'][k], np.nan)
+                df[f'SOC_{name}'] = result[name]['SOC'][k]
+        frames.append(df)
+    return frames
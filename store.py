@@ -0,0 +1,95 @@
+import io
+import json
+import os
+import sqlite3
+import time
+import numpy        as np
+import cache
+
+# Bump when the formulation or the result layout changes, older entries are then never hit
+VERSION = 1
+DB_PATH = os.environ.get('HBESS_STORE',
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), '.hbess_cache', 'results.sqlite'))
+
+def get_key(mode, cell_HE, cell_HP, profiles, V_pack, settings, bool_neg, bool_OCV, bool_voltage=True, solver=None):
+    # Canonical hash of every input that affects a solved case
+    #   settings: mode-specific inputs (node bounds, integer search limits), or None
+    #   solver: solver configuration (model.SOLVER), None for solves without the NLP
+    return cache.get_hash(VERSION, mode, cell_HE, cell_HP, profiles, V_pack, settings, bool_neg, bool_OCV, bool_voltage,
+                          solver)
+
+def encode(result):
+    # Scalars and stats as JSON, time series as one npz blob
+    meta = dict(cost=result['cost'], stats=result['stats'], dimensions=result['dimensions'], packs={})
+    arrays = {}
+    for name in ('HE', 'HP'):
+        if name not in result:
+            continue
+        pack = result[name]
+        meta['packs'][name] = dict(SERIES=pack['SERIES'], PARALLEL=pack['PARALLEL'], N=len(pack['P']))
+        for field in ('P', 'SOC', 'I'):
+            for k, values in enumerate(pack[field]):
+                arrays[f'{name}_{field}_{k}'] = values
+    blob = io.BytesIO()
+    np.savez(blob, **arrays)
+    return json.dumps(meta, default=str), blob.getvalue()
+
+def decode(meta, blob):
+    meta = json.loads(meta)
+    arrays = np.load(io.BytesIO(blob))
+    result = dict(cost=meta['cost'], stats=meta['stats'], dimensions=meta['dimensions'])
+    for name, pack in meta['packs'].items():
+        result[name] = dict(SERIES=pack['SERIES'], PARALLEL=pack['PARALLEL'])
+        for field in ('P', 'SOC', 'I'):
+            result[name][field] = [arrays[f'{name}_{field}_{k}'] for k in range(pack['N'])]
+    return result
+
+class ResultStore:
+    # SQLite-backed store of solved cases, safe to share between processes (WAL mode)
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self.connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('CREATE TABLE IF NOT EXISTS results ('
+                       'key TEXT PRIMARY KEY, mode TEXT, cost REAL, created REAL, meta TEXT, arrays BLOB)')
+
+    def connect(self):
+        # One short-lived connection per call, so threads and processes never share one
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        with self.connect() as db:
+            row = db.execute('SELECT meta, arrays FROM results WHERE key = ?', (key,)).fetchone()
+        return decode(*row) if row is not None else None
+
+    def put(self, key, result, mode=None):
+        meta, blob = encode(result)
+        with self.connect() as db:
+            db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                       (key, mode, result['cost'], time.time(), meta, blob))
+
+    def __contains__(self, key):
+        with self.connect() as db:
+            return db.execute('SELECT 1 FROM results WHERE key = ?', (key,)).fetchone() is not None
+
+    def __len__(self):
+        with self.connect() as db:
+            return db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+_store = None
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = ResultStore()
+    return _store
+
+def get_or_solve(key, solve, mode=None):
+    # Stored result for key, or solve() and store it; the app and batch tools share this path
+    result = get_store().get(key)
+    if result is None:
+        result = solve()
+        get_store().put(key, result, mode)
+    return result
@@ -0,0 +1,57 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy        as np
+import pandas       as pd
+import feasibility
+import model
+import store
+
+QUIET = dict(model.SOLVER, verbose=False)
+
+def get_chunks(voltages, n):
+    # n contiguous runs of voltages, so every point after the first of a run has a solved neighbour
+    return [list(chunk) for chunk in np.array_split(np.asarray(voltages, dtype=float), n) if len(chunk)]
+
+def solve_chunk(cell_HE, cell_HP, profiles, voltages, bool_neg, bool_OCV, solver=QUIET):
+    # Hybrid solves along one run of voltages, each warm-started from the previous point
+    problem = None
+    rows = []
+    for V_pack in voltages:
+        key = store.get_key('hybrid', cell_HE, cell_HP, profiles, V_pack, None, bool_neg, bool_OCV,
+                            solver=None if bool_OCV else solver)
+        def solve():
+            nonlocal problem
+            if bool_OCV:
+                # Linear at constant cell voltage: same optimum without the NLP
+                return feasibility.solve_relaxation(cell_HE, cell_HP, profiles, V_pack, bool_neg)
+            if problem is None:
+                problem = model.HBESSProblem('hybrid', cell_HE, cell_HP, [len(t) for t, _ in profiles],
+                                             bool_neg, bool_OCV, solver=solver)
+            return problem.extract(problem.solve(cell_HE, cell_HP, profiles, V_pack, warm_start=True))
+        row = dict(V_pack=V_pack)
+        try:
+            result = store.get_or_solve(key, solve, 'hybrid')
+        except RuntimeError:
+            rows.append(dict(row, cost=np.nan, status='failed'))
+            continue
+        rows.append(dict(row, cost=result['cost'], status=result['stats']['return_status'],
+                         iterations=result['stats']['iter_count'],
+                         SERIES_HE=result['HE']['SERIES'], PARALLEL_HE=result['HE']['PARALLEL'],
+                         SERIES_HP=result['HP']['SERIES'], PARALLEL_HP=result['HP']['PARALLEL']))
+    return rows
+
+def sweep(cell_HE, cell_HP, profiles, voltages, bool_neg, bool_OCV, workers=None, solver=QUIET):
+    # Cost versus nominal pack voltage, voltage runs solved in parallel worker processes
+    workers = min(workers or os.cpu_count(), len(voltages))
+    chunks = get_chunks(voltages, workers)
+    if workers == 1:
+        rows = solve_chunk(cell_HE, cell_HP, profiles, chunks[0], bool_neg, bool_OCV, solver)
+    else:
+        # spawn: forking a threaded server process is unsafe; one BLAS thread per worker avoids oversubscription
+        os.environ.setdefault('OMP_NUM_THREADS', '1')
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(solve_chunk, cell_HE, cell_HP, profiles, chunk, bool_neg, bool_OCV, solver)
+                       for chunk in chunks]
+            rows = [row for future in futures for row in future.result()]
+    return pd.DataFrame(rows).sort_values('V_pack', ignore_index=True)
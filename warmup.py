@@ -0,0 +1,57 @@
+# Prebuilt artifacts for a fast first request after a cold start.
+#   python warmup.py [--compiled]   at container start, before the server: solves the default
+#                                   inputs into the result store and compiles their code-generated
+#                                   solvers, both kept on disk
+#   start()                         called by the app once per server process: the same in a
+#                                   background thread, keeping the built problems in memory as
+#                                   templates (cache.templates) for the first session to take over,
+#                                   or in a solver worker process when solves run there (jobs.PROCESSES)
+import argparse
+import os
+import threading
+import time
+import cache
+import jobs
+import loads
+import model
+import sizing
+
+ENABLED = os.environ.get('HBESS_WARMUP', '1') != '0'
+SOLVER = dict(model.SOLVER, verbose=False)      # the app default, solver log off
+MODES = ('hybrid', 'HE', 'HP')
+
+def warm_up(compiled=False, processes=False):
+    # Interpolants, problems and stored results of the default inputs; seconds per step
+    timings = {}
+    start = time.perf_counter()
+    for cell in (sizing.CELL_HE, sizing.CELL_HP):
+        model.get_interpolant(cell)
+    scenarios = sizing.read_profiles([path for _, path in loads.PROFILES])
+    case = sizing.Sizing(sizing.CELL_HE, sizing.CELL_HP, [(scenario['t'], scenario['P']) for scenario in scenarios],
+                         solver=SOLVER, compiled=compiled)
+    timings['inputs'] = time.perf_counter() - start
+    for mode in MODES:
+        start = time.perf_counter()
+        case.solve(mode)
+        # Solved problems start warm from the default optimum; built anyway on a store hit
+        if processes:
+            jobs.run(sizing.solve_process, case.options, mode, None, None)
+        else:
+            cache.templates.put(case.get_problem_key(mode), case.get_problem(mode))
+        timings[mode] = time.perf_counter() - start
+    return timings
+
+def start():
+    # warm_up in a daemon thread, so it never delays a page
+    if not ENABLED:
+        return None
+    thread = threading.Thread(target=warm_up, args=(False, jobs.PROCESSES), name='hbess-warmup', daemon=True)
+    thread.start()
+    return thread
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prebuild the artifacts of the default inputs')
+    parser.add_argument('--compiled', action='store_true', help='also compile the code-generated solvers')
+    args = parser.parse_args()
+    for step, seconds in warm_up(args.compiled).items():
+        print(f"{step:<8}{seconds:>8.3f} s")